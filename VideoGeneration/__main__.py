@@ -0,0 +1,5 @@
+import sys
+
+from VideoGeneration.cli import main
+
+sys.exit(main())
@@ -0,0 +1,185 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+from VideoGeneration.videoGeneration import SpriteVideoGeneration
+
+_worker_generator = None
+
+
+def _init_render_worker(generator_kwargs: dict):
+    """
+    Build one SpriteVideoGeneration per worker process so it is reused across jobs.
+
+    Args:
+        generator_kwargs (dict): Keyword arguments for SpriteVideoGeneration.
+    """
+    global _worker_generator
+    _worker_generator = SpriteVideoGeneration(**generator_kwargs)
+
+
+def _render_job(sprite_path: str, rows: int, cols: int, prompt: str, save_directory: str,
+                animation_duration: int, animation_loop: int, stream_encode: bool, encoder_profile=None,
+                variant: str = None) -> tuple:
+    """
+    Run the CPU-bound stages (GIF animation and MP4 encode) inside a worker process.
+
+    Returns:
+        tuple: Path of the looped MP4 file and the stage records collected in the worker.
+    """
+    try:
+        video_path = _worker_generator.animate_sprite(sprite_path, rows, cols, prompt, save_directory,
+                                                      animation_duration=animation_duration,
+                                                      animation_loop=animation_loop,
+                                                      stream_encode=stream_encode,
+                                                      encoder_profile=encoder_profile, variant=variant)
+    finally:
+        records = _worker_generator.metrics.drain()
+    return video_path, records
+
+
+class BatchSpriteVideoGeneration:
+    """
+    Runs a batch of sprite video jobs with the network-bound and CPU-bound stages overlapped.
+
+    The DALL-E request, image download and Gemini request of every job run on a bounded
+    thread pool. As soon as a job has its sprite sheet and grid, its GIF animation and MP4
+    encode are handed to a process pool sized to the available cores. Finished videos are
+    merged in the order of the input jobs, regardless of which job finished first.
+
+    Attributes:
+        generator (SpriteVideoGeneration): Generator shared by the network-bound stages.
+        io_workers (int): Number of concurrent network-bound jobs.
+        cpu_workers (int): Number of worker processes for the CPU-bound stages.
+        render_kwargs (dict): SpriteVideoGeneration options for the render processes, without the
+            options only the fetch stages use.
+    """
+
+    FETCH_OPTIONS = ("sprite_index", "reuse_threshold")
+
+    def __init__(self, api_key: str, organization: str, gemini_api_key: str, default_size: str = "1024x1024",
+                 default_quality: str = "standard", max_tries: int = 1, io_workers: int = 8,
+                 cpu_workers: int = None, **generator_options):
+
+        """
+        Initialize the BatchSpriteVideoGeneration.
+
+        Args:
+            api_key (str): OpenAI API key.
+            organization (str): OpenAI organization ID.
+            gemini_api_key (str): Gemini API key.
+            default_size (str): Default size of the generated image.
+            default_quality (str): Default quality of the generated image.
+            max_tries (int): Number of attempts for every API request.
+            io_workers (int): Number of concurrent network-bound jobs.
+            cpu_workers (int): Number of worker processes, defaults to the number of cores.
+            **generator_options: Further keyword arguments for SpriteVideoGeneration (e.g. stream_copy_loop).
+        """
+
+        self.generator_kwargs = dict(
+            api_key=api_key, organization=organization, gemini_api_key=gemini_api_key,
+            default_size=default_size, default_quality=default_quality, max_tries=max_tries,
+            **generator_options
+        )
+        self.generator = SpriteVideoGeneration(**self.generator_kwargs)
+        # reuse is decided while fetching, and the index holds a connection and a lock that must not
+        # reach the render processes (spawned workers cannot unpickle them, forked ones would share them)
+        self.render_kwargs = {key: value for key, value in self.generator_kwargs.items()
+                              if key not in self.FETCH_OPTIONS}
+        self.io_workers = io_workers
+        self.cpu_workers = cpu_workers or os.cpu_count() or 1
+
+    def fetch_sprite(self, prompt: str, save_directory: str, gemini_prompt: str) -> tuple:
+
+        """
+        Run the network-bound stages for one job.
+
+        Args:
+            prompt (str): Prompt for DALL-E 3 image generation.
+            save_directory (str): Directory to save the generated image.
+            gemini_prompt (str): The Gemini prompt used to detect the sprite grid.
+
+        Returns:
+            tuple: Sprite sheet path, rows and columns.
+        """
+
+        sprite_path = self.generator.generate_and_download_sprite(prompt, save_directory)
+        rows, cols = self.generator.get_sprite_details(gemini_prompt, sprite_path)
+        return sprite_path, rows, cols
+
+    def generate_videos(self, video_json: list, save_directory: str, gemini_prompt: str,
+                        animation_loop: int = 0, stream_encode: bool = False) -> list:
+
+        """
+        Generate a looped MP4 for every job in the batch.
+
+        Args:
+            video_json (list): Jobs with a "video_prompt" and a "duration" key, and optionally an
+                "encoder_profile" (a profile name or a dict of EncoderProfile settings).
+            save_directory (str): Directory to save generated files.
+            gemini_prompt (str): The Gemini prompt used to detect the sprite grid.
+            animation_loop (int): Number of loops for the animation (use 0 for infinite loop).
+            stream_encode (bool): Encode the MP4s straight from the sprites instead of from the GIFs.
+
+        Returns:
+            list: MP4 paths in the order of video_json. Failed jobs are left out.
+        """
+
+        video_paths = [None] * len(video_json)
+        with ThreadPoolExecutor(max_workers=self.io_workers) as io_pool, \
+                ProcessPoolExecutor(max_workers=self.cpu_workers, initializer=_init_render_worker,
+                                    initargs=(self.render_kwargs,)) as cpu_pool:
+            fetches = {
+                io_pool.submit(self.fetch_sprite, item.get('video_prompt'), save_directory, gemini_prompt): index
+                for index, item in enumerate(video_json)
+            }
+            renders = {}
+            for future in as_completed(fetches):
+                index = fetches[future]
+                item = video_json[index]
+                try:
+                    sprite_path, rows, cols = future.result()
+                except Exception as e:
+                    print(f"Error fetching sprite for job {index}: {e}")
+                    continue
+                render = cpu_pool.submit(_render_job, sprite_path, rows, cols, item.get('video_prompt'),
+                                         save_directory, item.get('duration'), animation_loop, stream_encode,
+                                         item.get('encoder_profile'))
+                renders[render] = index
+
+            for future in as_completed(renders):
+                index = renders[future]
+                try:
+                    video_paths[index], records = future.result()
+                    self.generator.metrics.extend(records)
+                except Exception as e:
+                    print(f"Error rendering video for job {index}: {e}")
+
+        return [path for path in video_paths if path]
+
+    def run(self, video_json: list, save_directory: str, gemini_prompt: str, output_path: str,
+            target_width: int, target_height: int, animation_loop: int = 0, stream_encode: bool = False) -> list:
+
+        """
+        Generate every video in the batch and merge them into one output video.
+
+        Args:
+            video_json (list): Jobs with a "video_prompt" and a "duration" key.
+            save_directory (str): Directory to save generated files.
+            gemini_prompt (str): The Gemini prompt used to detect the sprite grid.
+            output_path (str): Path of the merged output video.
+            target_width (int): Width of the merged video.
+            target_height (int): Height of the merged video.
+            animation_loop (int): Number of loops for the animation (use 0 for infinite loop).
+            stream_encode (bool): Encode the MP4s straight from the sprites instead of from the GIFs.
+
+        Returns:
+            list: MP4 paths that were merged, in the order of video_json.
+        """
+
+        video_paths = self.generate_videos(video_json, save_directory, gemini_prompt,
+                                           animation_loop=animation_loop, stream_encode=stream_encode)
+        if not video_paths:
+            raise ValueError("No videos were generated, nothing to merge.")
+        self.generator.merge_and_resize_videos(video_paths=video_paths, output_path=output_path,
+                                               target_width=target_width, target_height=target_height)
+        return video_paths
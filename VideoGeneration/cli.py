@@ -0,0 +1,274 @@
+"""
+Command line interface over the generation, animation, merge and audio stages.
+
+    python -m VideoGeneration generate "a running fox sprite sheet with 4 rows and 4 columns"
+    python -m VideoGeneration animate sheet.png --rows 4 --cols 4 -o fox.gif
+    python -m VideoGeneration loop fox.gif fox.mp4 --target-duration 20
+    python -m VideoGeneration merge a.mp4 b.mp4 -o merged.mp4
+    python -m VideoGeneration add-audio merged.mp4 song.wav --stream-copy
+    python -m VideoGeneration extract-audio mp4_audios audios
+    python -m VideoGeneration index image_folder generated_sprites --duplicates
+
+Every command imports only the modules it runs, so --help and the local commands do not pay for
+the OpenAI, Gemini and moviepy imports.
+"""
+import argparse
+import json
+import os
+import sys
+
+GEMINI_PROMPT = ("Please tell me how many rows and columns in this sprite sheet, tell me only rows and "
+                 "columns no extra stuff please, answer me like that [rows] [columns].")
+
+
+def _local_generator(**options):
+    from VideoGeneration.videoGeneration import SpriteVideoGeneration
+
+    # local commands never call the APIs, and the clients are only built on first use
+    return SpriteVideoGeneration(api_key="", organization="", gemini_api_key="", **options)
+
+
+def generate(args):
+    from dotenv import load_dotenv
+    from VideoGeneration.batchGeneration import BatchSpriteVideoGeneration
+    from VideoGeneration.jobGraph import SpriteVideoPipeline
+
+    if args.jobs:
+        with open(args.jobs) as f:
+            video_json = json.load(f)
+    else:
+        video_json = [{"video_prompt": prompt, "duration": args.duration} for prompt in args.prompts]
+    if not video_json:
+        raise ValueError("Give at least one prompt or a --jobs file.")
+
+    load_dotenv()
+    os.makedirs(args.save_directory, exist_ok=True)
+    sprite_index = None
+    if args.reuse is not None or args.index:
+        from utilities.spriteindex.spriteindex import SpriteIndex
+
+        sprite_index = SpriteIndex(args.index or os.path.join(args.save_directory, "sprite_index.sqlite"))
+    batch = BatchSpriteVideoGeneration(
+        api_key=os.getenv("OPENAI_API_KEY", ""),
+        organization=os.getenv("ORGANIZATION_KEY", ""),
+        gemini_api_key=os.getenv("GEMINI_API_KEY", ""),
+        default_size=args.size,
+        default_quality=args.quality,
+        max_tries=args.max_tries,
+        stream_copy_loop=args.stream_copy_loop,
+        encoder_profile=args.profile,
+        sprite_index=sprite_index,
+        reuse_threshold=args.reuse,
+    )
+    manifest_path = args.manifest or os.path.join(args.save_directory, "manifest.sqlite")
+    pipeline = SpriteVideoPipeline(batch, manifest_path=manifest_path)
+    output_path = args.output or os.path.join(args.save_directory, "final_output.mp4")
+    print(pipeline.run(
+        video_json=video_json,
+        save_directory=args.save_directory,
+        gemini_prompt=args.gemini_prompt,
+        output_path=output_path,
+        target_width=args.width,
+        target_height=args.height,
+        animation_loop=args.loop,
+        stream_encode=args.stream_encode,
+        audio_paths=args.audio or None,
+        crossfade=args.crossfade,
+        rendition_heights=args.ladder,
+    ))
+
+
+def animate(args):
+    gif_writer = None
+    if args.gif_colors:
+        from utilities.gifwriter.gifwriter import GifWriter
+
+        gif_writer = GifWriter(colors=args.gif_colors)
+    compositor = None
+    if args.background:
+        from utilities.compositor.compositor import SpriteCompositor
+
+        compositor = SpriteCompositor(args.background, scroll=args.scroll)
+    generator = _local_generator(gif_writer=gif_writer, compositor=compositor)
+    rows, cols = args.rows, args.cols
+    if not rows or not cols:
+        grid = generator.grid_detector.detect(args.sheet)
+        if grid["confidence"] < generator.grid_confidence_threshold:
+            raise ValueError(f"Could not detect the grid of {args.sheet} (confidence {grid['confidence']:.2f}), "
+                             f"pass --rows and --cols.")
+        rows, cols = grid["rows"], grid["cols"]
+    output_path = args.output or os.path.splitext(args.sheet)[0] + ".gif"
+    generator.spritesheet_path = args.sheet
+    generator.extract_sprites(rows, cols)
+    generator.create_animation(output_path, duration=args.duration, loop=args.loop)
+    print(output_path)
+
+
+def loop(args):
+    generator = _local_generator(stream_copy_loop=args.stream_copy, encoder_profile=args.profile,
+                                 dedupe_frames=args.dedupe)
+    generator.target_duration = args.target_duration
+    generator.loop_and_convert_into_mp4(args.gif, args.output)
+    print(args.output)
+
+
+def merge(args):
+    generator = _local_generator(encoder_profile=args.profile)
+    if args.ladder:
+        name, _ = os.path.splitext(os.path.basename(args.output))
+        manifest = generator.merge_renditions(args.videos, os.path.dirname(os.path.abspath(args.output)),
+                                              heights=args.ladder, name=name)
+        print(manifest["manifest"])
+        return
+    generator.merge_and_resize_videos(args.videos, args.output, args.width, args.height)
+    print(args.output)
+
+
+def add_audio(args):
+    from audio_video_merge.merge_videos import add_audio_to_video
+
+    print(add_audio_to_video(args.video, args.audio, temp_dir=args.output_dir, new_video_dir=args.output_dir,
+                             crossfade=args.crossfade, stream_copy=args.stream_copy))
+
+
+def index(args):
+    from utilities.spriteindex.spriteindex import SpriteIndex
+
+    sprite_index = SpriteIndex(args.index)
+    try:
+        if args.directories:
+            print(sprite_index.scan(args.directories))
+        if args.nearest:
+            for match in sprite_index.nearest(args.nearest, args.rows, args.cols, threshold=args.threshold,
+                                              limit=args.limit):
+                print(f"{match['similarity']:.2f} {match['rows']}x{match['cols']} {match['path']}")
+        if args.duplicates:
+            for group in sprite_index.duplicates(args.max_distance):
+                print("\n".join(entry["path"] for entry in group) + "\n")
+    finally:
+        sprite_index.close()
+
+
+def extract_audio(args):
+    from audio_video_merge.extract_audio import extract_audio_batch
+
+    outputs = extract_audio_batch(args.source, args.output_directory, extension=args.extension,
+                                  workers=args.workers, force=args.force)
+    for audio_path in outputs.values():
+        print(audio_path)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m VideoGeneration", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--metrics", help="Write the stage timings of the run to this JSON lines file.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="Generate sprite videos from prompts and merge them.")
+    generate_parser.add_argument("prompts", nargs="*", help="Sprite sheet prompts, one video each.")
+    generate_parser.add_argument("--jobs", help="JSON file with a video_json list instead of prompts.")
+    generate_parser.add_argument("--duration", type=int, default=100, help="Frame duration in milliseconds.")
+    generate_parser.add_argument("--save-directory", default="generated_sprites")
+    generate_parser.add_argument("-o", "--output", help="Final video, save_directory/final_output.mp4 by default.")
+    generate_parser.add_argument("--manifest", help="Job graph manifest, save_directory/manifest.sqlite by default.")
+    generate_parser.add_argument("--width", type=int, default=480)
+    generate_parser.add_argument("--height", type=int, default=480)
+    generate_parser.add_argument("--loop", type=int, default=0, help="GIF loop count (0 loops forever).")
+    generate_parser.add_argument("--size", default="1024x1024", help="Size of the generated sprite sheets.")
+    generate_parser.add_argument("--quality", default="standard", help="Quality of the generated sprite sheets.")
+    generate_parser.add_argument("--max-tries", type=int, default=3)
+    generate_parser.add_argument("--gemini-prompt", default=GEMINI_PROMPT)
+    generate_parser.add_argument("--profile", default="default", help="Encoder profile.")
+    generate_parser.add_argument("--stream-encode", action="store_true", help="Encode MP4s straight from the sprites.")
+    generate_parser.add_argument("--stream-copy-loop", action="store_true",
+                                 help="Encode one animation cycle and loop it by stream copy.")
+    generate_parser.add_argument("--audio", nargs="*", help="Audio files for the soundtrack of the final video.")
+    generate_parser.add_argument("--crossfade", type=int, default=0, help="Crossfade between audio files in ms.")
+    generate_parser.add_argument("--ladder", type=int, nargs="+", metavar="HEIGHT",
+                                 help="Also write renditions of these heights, a poster and a manifest.")
+    generate_parser.add_argument("--reuse", type=float, metavar="SIMILARITY",
+                                 help="Reuse an indexed sprite sheet of the same grid whose prompt is this similar (0-1).")
+    generate_parser.add_argument("--index", help="Sprite sheet index, save_directory/sprite_index.sqlite by default.")
+    generate_parser.set_defaults(handler=generate)
+
+    animate_parser = subparsers.add_parser("animate", help="Turn a local sprite sheet into a GIF.")
+    animate_parser.add_argument("sheet")
+    animate_parser.add_argument("--rows", type=int, help="Rows of the sheet, detected locally when omitted.")
+    animate_parser.add_argument("--cols", type=int, help="Columns of the sheet, detected locally when omitted.")
+    animate_parser.add_argument("-o", "--output", help="GIF path, next to the sheet by default.")
+    animate_parser.add_argument("--duration", type=int, default=150, help="Frame duration in milliseconds.")
+    animate_parser.add_argument("--loop", type=int, default=0, help="Loop count (0 loops forever).")
+    animate_parser.add_argument("--gif-colors", type=int,
+                                help="Write with one shared palette of this many colors and cropped frame deltas.")
+    animate_parser.add_argument("--background", help="Image the sprites are composited over.")
+    animate_parser.add_argument("--scroll", type=int, nargs=2, default=(0, 0), metavar=("DX", "DY"),
+                                help="Background movement in pixels per frame.")
+    animate_parser.set_defaults(handler=animate)
+
+    loop_parser = subparsers.add_parser("loop", help="Loop a GIF into an MP4 of a target duration.")
+    loop_parser.add_argument("gif")
+    loop_parser.add_argument("output")
+    loop_parser.add_argument("--target-duration", type=float, default=20, help="Length of the MP4 in seconds.")
+    loop_parser.add_argument("--profile", default="default", help="Encoder profile.")
+    loop_parser.add_argument("--stream-copy", action="store_true", help="Encode one cycle and loop it by stream copy.")
+    loop_parser.add_argument("--dedupe", action="store_true", help="Merge duplicate frames into a VFR encode.")
+    loop_parser.set_defaults(handler=loop)
+
+    merge_parser = subparsers.add_parser("merge", help="Merge videos into one, resized to the target size.")
+    merge_parser.add_argument("videos", nargs="+")
+    merge_parser.add_argument("-o", "--output", required=True)
+    merge_parser.add_argument("--width", type=int, default=480)
+    merge_parser.add_argument("--height", type=int, default=480)
+    merge_parser.add_argument("--profile", default="default", help="Encoder profile.")
+    merge_parser.add_argument("--ladder", type=int, nargs="+", metavar="HEIGHT",
+                              help="Write renditions of these heights, a poster and a manifest next to --output.")
+    merge_parser.set_defaults(handler=merge)
+
+    audio_parser = subparsers.add_parser("add-audio", help="Replace the soundtrack of a video.")
+    audio_parser.add_argument("video")
+    audio_parser.add_argument("audio", nargs="+", help="Audio files, each looped to an equal share of the video.")
+    audio_parser.add_argument("--output-dir", default="final_audio_video")
+    audio_parser.add_argument("--crossfade", type=int, default=0, help="Crossfade between audio files in ms.")
+    audio_parser.add_argument("--stream-copy", action="store_true",
+                              help="Copy the video stream instead of re-encoding it.")
+    audio_parser.set_defaults(handler=add_audio)
+
+    index_parser = subparsers.add_parser("index", help="Index sprite sheets, find the nearest one or duplicates.")
+    index_parser.add_argument("directories", nargs="*", help="Directories scanned into the index.")
+    index_parser.add_argument("--index", default=".sprite_index.sqlite", help="Path of the index.")
+    index_parser.add_argument("--nearest", metavar="PROMPT", help="Print the indexed sheets closest to this prompt.")
+    index_parser.add_argument("--rows", type=int, help="Rows the nearest sheets must have, read from the prompt when omitted.")
+    index_parser.add_argument("--cols", type=int, help="Columns the nearest sheets must have.")
+    index_parser.add_argument("--threshold", type=float, default=0.5, help="Smallest prompt similarity (0-1).")
+    index_parser.add_argument("--limit", type=int, default=5, help="Number of nearest sheets printed.")
+    index_parser.add_argument("--duplicates", action="store_true", help="Print groups of near-identical sheets.")
+    index_parser.add_argument("--max-distance", type=int, help="Differing hash bits within a duplicate group.")
+    index_parser.set_defaults(handler=index)
+
+    extract_parser = subparsers.add_parser("extract-audio", help="Extract the audio tracks of videos.")
+    extract_parser.add_argument("source", help="Directory of videos or a glob pattern.")
+    extract_parser.add_argument("output_directory")
+    extract_parser.add_argument("--extension", default=".wav", help="Extension of the audio files.")
+    extract_parser.add_argument("--workers", type=int, help="Worker processes, the number of cores by default.")
+    extract_parser.add_argument("--force", action="store_true", help="Extract again even when up to date.")
+    extract_parser.set_defaults(handler=extract_audio)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        args.handler(args)
+    except (ValueError, IOError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if args.metrics:
+            from utilities.instrumentation.instrumentation import pipeline_metrics
+
+            pipeline_metrics.write_jsonl(args.metrics)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+import os
+import threading
+from contextlib import ExitStack
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from VideoGeneration.batchGeneration import BatchSpriteVideoGeneration, _init_render_worker, _render_job
+from utilities.manifest.manifest import ArtifactManifest
+
+# guards the in-flight registries, which graphs running at the same time may share
+_inflight_lock = threading.Lock()
+
+
+class Stage:
+    """
+    One node of a JobGraph.
+
+    Attributes:
+        name (str): Unique name of the stage within the graph.
+        kind (str): Kind of the stage (e.g. "sheet"), part of its input hash.
+        fn (callable): Called with the values of the dependencies, in order, followed by kwargs.
+        deps (tuple): Names of the stages this one depends on.
+        params (dict): JSON-serializable parameters that decide whether the stage must rerun.
+        outputs (callable): Maps the stage value to the list of files it wrote.
+        pool (str): "io" to run on the thread pool, "cpu" to run on the process pool. A "cpu"
+            stage returns its value together with the stage records collected in the worker.
+        kwargs (dict): Extra keyword arguments for fn.
+    """
+
+    def __init__(self, name: str, kind: str, fn, deps: tuple = (), params: dict = None, outputs=None,
+                 pool: str = "io", kwargs: dict = None):
+        self.name = name
+        self.kind = kind
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.params = params or {}
+        self.outputs = outputs or (lambda value: [])
+        self.pool = pool
+        self.kwargs = kwargs or {}
+
+
+class JobGraph:
+    """
+    Runs a DAG of stages, skipping every stage the manifest already has a valid result for.
+
+    A stage's input hash covers its parameters and the fingerprints (value and output file
+    contents) of its dependencies. A stage runs only when no finished result is recorded for
+    that hash or its outputs have gone missing or changed, so a rerun picks up after the last
+    failure and a changed parameter only reruns the stages downstream of it. Stages start as
+    soon as their dependencies are done; a failed stage skips its dependents. Graphs that share
+    an in-flight registry run a stage with a given input hash only once at a time: the others
+    wait for that run and take its result instead of writing the same files concurrently.
+
+    Attributes:
+        manifest (ArtifactManifest): Record of finished stages.
+        io_pool (ThreadPoolExecutor): Long-lived pool for "io" stages, a pool per run when None.
+        cpu_pool (ProcessPoolExecutor): Long-lived pool for "cpu" stages, a pool per run when None.
+        inflight (dict): Futures of the stages being run, by input hash, shared with other graphs.
+        stages (dict): Stages by name, in insertion order.
+        executed (list): Names of the stages the last run executed.
+        reused (list): Names of the stages the last run took from the manifest.
+        failed (list): Names of the stages that failed or were skipped in the last run.
+    """
+
+    def __init__(self, manifest: ArtifactManifest, io_workers: int = 8, cpu_workers: int = None,
+                 cpu_initializer=None, cpu_initargs: tuple = (), metrics=None, io_pool=None, cpu_pool=None,
+                 inflight: dict = None):
+        self.manifest = manifest
+        self.io_pool = io_pool
+        self.cpu_pool = cpu_pool
+        self.inflight = inflight if inflight is not None else {}
+        self.io_workers = io_workers
+        self.cpu_workers = cpu_workers or os.cpu_count() or 1
+        self.cpu_initializer = cpu_initializer
+        self.cpu_initargs = cpu_initargs
+        self.metrics = metrics
+        self.stages = {}
+        self.executed = []
+        self.reused = []
+        self.failed = []
+
+    def add(self, stage: Stage) -> str:
+
+        """
+        Add a stage to the graph. A stage with the same name is only added once.
+
+        Args:
+            stage (Stage): Stage to add. Its dependencies must already be in the graph.
+
+        Returns:
+            str: Name of the stage.
+
+        Raises:
+            ValueError: If a dependency is unknown.
+        """
+
+        if stage.name in self.stages:
+            return stage.name
+        for dep in stage.deps:
+            if dep not in self.stages:
+                raise ValueError(f"Stage {stage.name} depends on unknown stage {dep}")
+        self.stages[stage.name] = stage
+        return stage.name
+
+    def run(self) -> dict:
+
+        """
+        Run every stage whose result is not already valid in the manifest.
+
+        Returns:
+            dict: Values of the finished stages by name.
+        """
+
+        self.executed, self.reused, self.failed = [], [], []
+        pending = dict(self.stages)
+        done = {}
+        running = {}
+        with ExitStack() as stack:
+            io_pool = self.io_pool or stack.enter_context(ThreadPoolExecutor(max_workers=self.io_workers))
+            cpu_pool = self.cpu_pool or stack.enter_context(ProcessPoolExecutor(
+                max_workers=self.cpu_workers, initializer=self.cpu_initializer, initargs=self.cpu_initargs))
+            while pending or running:
+                progressed = False
+                for name, stage in list(pending.items()):
+                    if any(dep in self.failed for dep in stage.deps):
+                        print(f"Skipping stage {name}: a dependency failed")
+                        self.failed.append(name)
+                        del pending[name]
+                        progressed = True
+                        continue
+                    if not all(dep in done for dep in stage.deps):
+                        continue
+                    del pending[name]
+                    progressed = True
+                    input_hash = self.manifest.hash_inputs(stage.kind, stage.params,
+                                                           [done[dep][1] for dep in stage.deps])
+                    # looked up under the lock, so a result recorded by another graph is seen
+                    with _inflight_lock:
+                        cached = self.manifest.lookup(input_hash)
+                        claim = self.inflight.get(input_hash) if cached is None else None
+                        owner = cached is None and claim is None
+                        if owner:
+                            claim = self.inflight[input_hash] = Future()
+                    if cached is not None:
+                        done[name] = cached
+                        self.reused.append(name)
+                        continue
+                    if not owner:
+                        # another graph is running this stage, wait for its result
+                        running[claim] = (stage, input_hash, None)
+                        continue
+                    pool = cpu_pool if stage.pool == "cpu" else io_pool
+                    try:
+                        future = pool.submit(stage.fn, *[done[dep][0] for dep in stage.deps], **stage.kwargs)
+                    except Exception as e:
+                        with _inflight_lock:
+                            self.inflight.pop(input_hash, None)
+                        claim.set_exception(e)
+                        raise
+                    running[future] = (stage, input_hash, claim)
+                if progressed or not running:
+                    continue
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage, input_hash, claim = running.pop(future)
+                    if claim is None:
+                        try:
+                            done[stage.name] = future.result()
+                            self.reused.append(stage.name)
+                        except Exception as e:
+                            print(f"Error in stage {stage.name}: {e}")
+                            self.failed.append(stage.name)
+                        continue
+                    try:
+                        value = future.result()
+                        if stage.pool == "cpu":
+                            value, records = value
+                            if self.metrics is not None:
+                                self.metrics.extend(records)
+                        fingerprint = self.manifest.record(input_hash, stage.name, value, stage.outputs(value))
+                        done[stage.name] = (value, fingerprint)
+                        self.executed.append(stage.name)
+                        claim.set_result((value, fingerprint))
+                    except Exception as e:
+                        print(f"Error in stage {stage.name}: {e}")
+                        self.failed.append(stage.name)
+                        claim.set_exception(e)
+                    finally:
+                        with _inflight_lock:
+                            self.inflight.pop(input_hash, None)
+
+        print(f"Job graph: {len(self.executed)} stages run, {len(self.reused)} reused, {len(self.failed)} failed")
+        return {name: value for name, (value, _) in done.items()}
+
+
+def _render_stage(sprite_path: str, grid: list, prompt: str, save_directory: str, animation_duration: int,
+                  animation_loop: int, stream_encode: bool, encoder_profile=None, variant: str = None) -> tuple:
+    return _render_job(sprite_path, grid[0], grid[1], prompt, save_directory, animation_duration,
+                       animation_loop, stream_encode, encoder_profile, variant)
+
+
+class SpriteVideoPipeline:
+    """
+    Resumable version of BatchSpriteVideoGeneration.run built on a JobGraph.
+
+    Every job becomes a sheet → grid → video chain (the frames are extracted inside the
+    video stage, on the worker processes), followed by one merge stage over all videos and
+    an optional audio stage. Results are recorded in an SQLite manifest, so a rerun after a
+    failure resumes where it stopped, and changing the duration of one job re-encodes only
+    that job's video and the merge.
+
+    Attributes:
+        batch (BatchSpriteVideoGeneration): Supplies the generator and the worker settings.
+        manifest (ArtifactManifest): Record of finished stages.
+        io_pool (ThreadPoolExecutor): Long-lived pool shared by every run, a pool per run when None.
+        cpu_pool (ProcessPoolExecutor): Long-lived render pool shared by every run, a pool per run when None.
+        inflight (dict): Stages being run by any run of this pipeline, so concurrent runs that need
+            the same stage (e.g. the same prompt in two worker jobs) render it once.
+    """
+
+    def __init__(self, batch: BatchSpriteVideoGeneration, manifest_path: str = "manifest.sqlite",
+                 io_pool: ThreadPoolExecutor = None, cpu_pool: ProcessPoolExecutor = None):
+        self.batch = batch
+        self.manifest = ArtifactManifest(manifest_path)
+        self.io_pool = io_pool
+        self.cpu_pool = cpu_pool
+        self.inflight = {}
+
+    def build(self, video_json: list, save_directory: str, gemini_prompt: str, output_path: str,
+              target_width: int, target_height: int, animation_loop: int = 0, stream_encode: bool = False,
+              audio_paths: list = None, audio_directory: str = None, crossfade: int = 0,
+              rendition_heights: tuple = None) -> tuple:
+
+        """
+        Build the job graph for a batch.
+
+        Args:
+            video_json (list): Jobs with a "video_prompt" and a "duration" key.
+            save_directory (str): Directory to save generated files.
+            gemini_prompt (str): The Gemini prompt used to detect the sprite grid.
+            output_path (str): Path of the merged output video.
+            target_width (int): Width of the merged video.
+            target_height (int): Height of the merged video.
+            animation_loop (int): Number of loops for the animation (use 0 for infinite loop).
+            stream_encode (bool): Encode the MP4s straight from the sprites instead of from the GIFs.
+            audio_paths (list): Audio files to add to the merged video, none when omitted.
+            audio_directory (str): Directory of the video with audio, next to output_path by default.
+            crossfade (int): Crossfade between consecutive audio files in milliseconds.
+            rendition_heights (tuple): Also encode the final video at these heights (e.g. 480, 720, 1080)
+                with a poster, next to output_path; no renditions when omitted.
+
+        Returns:
+            tuple: The JobGraph and the name of its final stage.
+        """
+
+        generator = self.batch.generator
+        graph = JobGraph(self.manifest, io_workers=self.batch.io_workers, cpu_workers=self.batch.cpu_workers,
+                         cpu_initializer=_init_render_worker, cpu_initargs=(self.batch.render_kwargs,),
+                         metrics=generator.metrics, io_pool=self.io_pool, cpu_pool=self.cpu_pool,
+                         inflight=self.inflight)
+        render_params = dict(loop=animation_loop, stream_encode=stream_encode,
+                             target_duration=generator.target_duration,
+                             stream_copy_loop=generator.stream_copy_loop,
+                             dedupe=None if generator.deduplicator is None else generator.deduplicator.threshold,
+                             default_profile=vars(generator.encoder_profile),
+                             gif_writer=None if generator.gif_writer is None else vars(generator.gif_writer),
+                             compositor=None if generator.compositor is None else generator.compositor.params())
+
+        video_stages = []
+        for item in video_json:
+            prompt = item.get('video_prompt')
+            job = generator.utils.senitize_path(prompt)
+            sheet = graph.add(Stage(
+                f"sheet:{job}", "sheet",
+                lambda prompt=prompt: generator.generate_and_download_sprite(prompt, save_directory),
+                params=dict(model=generator.image_model, prompt=job, size=generator.default_size,
+                            quality=generator.default_quality, save_directory=save_directory),
+                outputs=lambda path: [path],
+            ))
+            grid = graph.add(Stage(
+                f"grid:{job}", "grid",
+                lambda sprite_path: list(generator.get_sprite_details(gemini_prompt, sprite_path)),
+                deps=(sheet,),
+                params=dict(gemini_prompt=gemini_prompt, threshold=generator.grid_confidence_threshold),
+            ))
+            video_params = dict(prompt=prompt, duration=item.get('duration'),
+                                encoder_profile=item.get('encoder_profile'), **render_params)
+            # jobs of one prompt with different settings write different files, identical jobs share one stage
+            variant = self.manifest.hash_inputs("video", video_params, [])[:12]
+            video_stages.append(graph.add(Stage(
+                f"video:{job}:{variant}", "video", _render_stage,
+                deps=(sheet, grid),
+                params=video_params,
+                outputs=lambda path: [path],
+                pool="cpu",
+                kwargs=dict(prompt=prompt, save_directory=save_directory,
+                            animation_duration=item.get('duration'), animation_loop=animation_loop,
+                            stream_encode=stream_encode, encoder_profile=item.get('encoder_profile'),
+                            variant=variant),
+            )))
+
+        final = graph.add(Stage(
+            "merge", "merge",
+            lambda *video_paths: generator.merge_and_resize_videos(list(video_paths), output_path,
+                                                                   target_width, target_height),
+            deps=tuple(video_stages),
+            params=dict(output_path=output_path, width=target_width, height=target_height,
+                        codec_args=generator.merger.codec_args, variable_frame_rate=generator.merger.variable_frame_rate),
+            outputs=lambda path: [path],
+        ))
+
+        if audio_paths:
+            from audio_video_merge.merge_videos import add_audio_to_video
+
+            audio_directory = audio_directory or os.path.dirname(os.path.abspath(output_path))
+            final = graph.add(Stage(
+                "audio", "audio",
+                lambda video_path: add_audio_to_video(video_path, audio_paths, new_video_dir=audio_directory,
+                                                      crossfade=crossfade, stream_copy=True),
+                deps=(final,),
+                params=dict(audio=ArtifactManifest.hash_outputs(None, audio_paths), crossfade=crossfade,
+                            audio_directory=audio_directory),
+                outputs=lambda path: [path],
+            ))
+
+        if rendition_heights:
+            name, _ = os.path.splitext(os.path.basename(output_path))
+            rendition_directory = os.path.dirname(os.path.abspath(output_path))
+            final = graph.add(Stage(
+                "renditions", "renditions",
+                lambda video_path: generator.merge_renditions([video_path], rendition_directory,
+                                                              heights=rendition_heights, name=name),
+                deps=(final,),
+                params=dict(heights=sorted(rendition_heights), directory=rendition_directory,
+                            codec_args=generator.merger.codec_args),
+                outputs=lambda manifest: ([rendition["path"] for rendition in manifest["renditions"]]
+                                          + [manifest["poster"]["path"], manifest["manifest"]]),
+            ))
+        return graph, final
+
+    def run(self, *args, **kwargs) -> str:
+
+        """
+        Build the job graph and run it. Takes the same arguments as build.
+
+        Returns:
+            str: Path of the final video, or the rendition manifest (dict) when rendition_heights is given.
+
+        Raises:
+            ValueError: If a stage failed, after every independent stage has finished.
+        """
+
+        graph, final = self.build(*args, **kwargs)
+        values = graph.run()
+        if final not in values:
+            raise ValueError(f"Pipeline did not finish, failed stages: {', '.join(graph.failed)}")
+        return values[final]
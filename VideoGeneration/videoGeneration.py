@@ -1,16 +1,18 @@
-import time
+import itertools
+import math
 
-from openai import OpenAI
-import requests
-import os
-from PIL import Image
-import textwrap
-import google.generativeai as genai
-from moviepy.editor import VideoFileClip, concatenate_videoclips
 import os
+import shutil
+import tempfile
 import re
-import requests
 from utilities.senitizepath.senitizepath import SenitizePath
+from utilities.generationcache.generationcache import GenerationCache
+from utilities.ffmpegtools.ffmpegtools import FFmpegTools
+from utilities.videomerge.videomerge import VideoMerger
+from utilities.downloader.downloader import AssetDownloader
+from utilities.requestscheduler.requestscheduler import RequestScheduler
+from utilities.instrumentation.instrumentation import PipelineMetrics, pipeline_metrics
+from utilities.encoderprofile.encoderprofile import EncoderProfile
 
 
 class SpriteVideoGeneration:
@@ -18,9 +20,12 @@ class SpriteVideoGeneration:
     Class for generating videos using OpenAI DALL-E 3 and Geminai model.
 
     Attributes:
-        client (OpenAI): OpenAI API client.
+        client (OpenAI): OpenAI API client, created on first use.
+        model (GenerativeModel): Gemini model, created on first use.
         default_size (str): Default size of the generated image.
         default_quality (str): Default quality of the generated image.
+        cache (GenerationCache): On-disk cache of generated sprite sheets.
+        grid_detector (SpriteGridDetector): Local detector for the rows and columns of a sprite sheet.
 
     Methods:
         download_image(prompt, url, save_directory): Downloads an image from the given URL and saves it in the specified directory.
@@ -29,7 +34,13 @@ class SpriteVideoGeneration:
     """
 
     def __init__(self, api_key: str, organization: str, gemini_api_key: str, default_size: str = "1024x1024",
-                 default_quality: str = "standard", max_tries: int =1):
+                 default_quality: str = "standard", max_tries: int =1, cache: GenerationCache = None,
+                 grid_detector: "SpriteGridDetector" = None, grid_confidence_threshold: float = 0.5,
+                 stream_copy_loop: bool = False, downloader: AssetDownloader = None, response_format: str = "url",
+                 scheduler: RequestScheduler = None, metrics: PipelineMetrics = None,
+                 encoder_profile="default", dedupe_frames: bool = False, dedupe_threshold: float = 0.0,
+                 gif_writer: "GifWriter" = None, compositor: "SpriteCompositor" = None,
+                 sprite_index: "SpriteIndex" = None, reuse_threshold: float = None):
 
         """
         Initialize the SpriteVideoGeneration.
@@ -39,18 +50,43 @@ class SpriteVideoGeneration:
             organization (str): OpenAI organization ID.
             default_size (str): Default size of the generated image.
             default_quality (str): Default quality of the generated image.
+            cache (GenerationCache): Cache of generated sprite sheets, a default one is created on the first
+                generation when omitted.
+            grid_detector (SpriteGridDetector): Local grid detector, a default one is created when omitted.
+            grid_confidence_threshold (float): Minimum confidence to trust the local grid detector over Gemini.
+            stream_copy_loop (bool): Encode one animation cycle and repeat it up to target_duration with a
+                stream copy instead of re-encoding every looped frame.
+            downloader (AssetDownloader): Shared downloader, a default one is created when omitted.
+            response_format (str): "url" to download the generated image, or "b64_json" to receive it
+                inline in the images API response and skip the download.
+            scheduler (RequestScheduler): Rate limiter and retry policy for the OpenAI and Gemini calls,
+                a default one with max_tries attempts is created when omitted.
+            metrics (PipelineMetrics): Where stage timings are recorded, the shared pipeline_metrics by default.
+            encoder_profile: Default EncoderProfile, or its name in PROFILES; jobs may override it.
+            dedupe_frames (bool): Merge runs of duplicate frames and encode variable frame rate video.
+            dedupe_threshold (float): Mean absolute pixel difference below which frames count as duplicates.
+            gif_writer (GifWriter): Writer with one shared palette and cropped frame deltas for the GIF
+                animations; PIL's per-frame writer is used when omitted.
+            compositor (SpriteCompositor): Blends the extracted frames over a background before any output.
+            sprite_index (SpriteIndex): Index of existing sprite sheets, new sheets are added to it.
+            reuse_threshold (float): Prompt similarity at which an indexed sheet with the same grid is reused
+                instead of generating a new one; sheets are never reused when None.
             spritesheet_path (str): Path to the input sprite sheet image.
             rows (int): Number of rows in the sprite sheet.
             cols (int): Number of columns in the sprite sheet.
             sprite_width (int): Width of each sprite in the sprite sheet.
             sprite_height (int): Height of each sprite in the sprite sheet.
-            sprites (list): List to hold each sprite image.
+            sprites (SpriteFrameStore): Frames of the current sprite sheet.
         """
 
         self.output_mp4 = None
-        self.client = OpenAI(api_key=api_key, organization=organization)
-        genai.configure(api_key=gemini_api_key)
-        self.model = genai.GenerativeModel('gemini-pro-vision')
+        # the SDKs take seconds to import, so the clients are only built by the stages that call them
+        self._api_key = api_key
+        self._organization = organization
+        self._gemini_api_key = gemini_api_key
+        self._client = None
+        self._model = None
+        self.image_model = "dall-e-3"
         self.default_size = default_size
         self.default_quality = default_quality
         self.spritesheet_path = ""
@@ -59,9 +95,91 @@ class SpriteVideoGeneration:
         self.sprite_width = 0
         self.sprite_height = 0
         self.target_duration = 20
+        self.stream_copy_loop = stream_copy_loop
         self.max_tries = max_tries
         self.utils = SenitizePath()
-        self.sprites = []
+        self._sprites = None
+        self._cache = cache
+        self._grid_detector = grid_detector
+        self.grid_confidence_threshold = grid_confidence_threshold
+        self.ffmpeg = FFmpegTools()
+        self.encoder_profile = EncoderProfile.get(encoder_profile)
+        self.deduplicator = None
+        if dedupe_frames:
+            from utilities.framededup.framededup import FrameDeduplicator
+
+            self.deduplicator = FrameDeduplicator(dedupe_threshold)
+        self.gif_writer = gif_writer
+        self.compositor = compositor
+        self.sprite_index = sprite_index
+        self.reuse_threshold = reuse_threshold
+        self.merger = VideoMerger(self.ffmpeg, codec_args=self.encoder_profile.codec_args(), variable_frame_rate=dedupe_frames)
+        self.downloader = downloader or AssetDownloader()
+        self.response_format = response_format
+        if scheduler is None:
+            scheduler = RequestScheduler(max_tries=max_tries)
+            scheduler.configure("openai", rate=1.0, burst=5, max_concurrency=5)
+            scheduler.configure("gemini", rate=1.0, burst=5, max_concurrency=4)
+        self.scheduler = scheduler
+        self.metrics = metrics or pipeline_metrics
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI
+
+            # RequestScheduler owns retries and backoff, SDK retries would multiply its attempts during a 429 storm
+            self._client = OpenAI(api_key=self._api_key, organization=self._organization, max_retries=0)
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    @property
+    def model(self):
+        if self._model is None:
+            import google.generativeai as genai
+
+            genai.configure(api_key=self._gemini_api_key)
+            self._model = genai.GenerativeModel('gemini-pro-vision')
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
+
+    # the frame store and the grid detector pull in numpy and PIL, which merge and audio commands never use
+    @property
+    def sprites(self):
+        if self._sprites is None:
+            from utilities.framestore.framestore import SpriteFrameStore
+
+            self._sprites = SpriteFrameStore()
+        return self._sprites
+
+    @property
+    def grid_detector(self):
+        if self._grid_detector is None:
+            from utilities.spritegrid.spritegrid import SpriteGridDetector
+
+            self._grid_detector = SpriteGridDetector()
+        return self._grid_detector
+
+    @grid_detector.setter
+    def grid_detector(self, grid_detector):
+        self._grid_detector = grid_detector
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            # created on first use, so commands and render workers that never generate leave no cache directory
+            self._cache = GenerationCache()
+        return self._cache
+
+    @cache.setter
+    def cache(self, cache):
+        self._cache = cache
 
     def get_image_url(self, prompt: str, size: str, quality: str) -> str:
 
@@ -76,54 +194,73 @@ class SpriteVideoGeneration:
         Returns:
             str: Image URL.
         """
-        for retry in range(self.max_tries):
-            try:
-                response = self.client.images.generate(
-                    model="dall-e-3",
-                    prompt=prompt,
-                    size=size,
-                    quality=quality,
-                    n=1,
-                )
-                # Assuming 'data' and 'url' keys are available in the response
-                image_url = response.data[0].url
-                return image_url
-
-            except Exception as e:
-                print(f"Error generating image (attempt {retry + 1}/{3}): {e}")
-                time.sleep(1)
+        return self.generate_image(prompt, size, quality, response_format="url").url
 
-    def download_image(self, prompt: str, url: str, save_directory: str) -> str:
+    def generate_image(self, prompt: str, size: str, quality: str, response_format: str = "url"):
 
         """
-        Downloads an image from the given URL and saves it in the specified directory.
+        Generates an image using DALL-E 3.
+
+        Args:
+            prompt (str): Prompt for DALL-E 3 image generation.
+            size (str): Size of the generated image (e.g., "1024x1024").
+            quality (str): Quality of the generated image (e.g., "standard").
+            response_format (str): "url" or "b64_json".
+
+        Returns:
+            Image: The generated image entry, with its url or b64_json set.
+
+        Raises:
+            Exception: The last API error once every attempt failed.
+        """
+        with self.metrics.stage("dalle", job=prompt):
+            response = self.scheduler.call(
+                "openai", self.client.images.generate,
+                key=("images", self.image_model, prompt, size, quality, response_format),
+                model=self.image_model,
+                prompt=prompt,
+                size=size,
+                quality=quality,
+                response_format=response_format,
+                n=1,
+            )
+        return response.data[0]
+
+    def sprite_sheet_path(self, prompt: str, save_directory: str) -> str:
+
+        """
+        Build the path a sprite sheet is saved at and create its folder.
 
         Args:
             prompt (str): A string that will be used to create nested folders.
-            url (str): URL of the image to be downloaded.
-            save_directory (str): Directory to save the downloaded image.
+            save_directory (str): Directory to save the image in.
 
         Returns:
-            str: File path of the saved image.
+            str: File path of the sprite sheet.
         """
         prompt = self.utils.senitize_path(prompt)
-        if not os.path.exists(save_directory):
-            os.makedirs(save_directory)
-
         prompt_folder = os.path.join(save_directory, prompt)
         if not os.path.exists(prompt_folder):
             os.makedirs(prompt_folder)
 
-        image_name = os.path.join(prompt_folder, f"{prompt}.png")
-        response = requests.get(url)
+        return os.path.join(prompt_folder, f"{prompt}.png")
 
-        if response.status_code == 200:
-            with open(image_name, 'wb') as f:
-                f.write(response.content)
-            return image_name
-        else:
-            raise ValueError(
-                f"Failed to download image from {url}. Status code: {response.status_code}")
+    def download_image(self, prompt: str, url: str, save_directory: str) -> str:
+
+        """
+        Downloads an image from the given URL and saves it in the specified directory.
+
+        Args:
+            prompt (str): A string that will be used to create nested folders.
+            url (str): URL of the image to be downloaded.
+            save_directory (str): Directory to save the downloaded image.
+
+        Returns:
+            str: File path of the saved image.
+        """
+        image_name = self.sprite_sheet_path(prompt, save_directory)
+        with self.metrics.stage("download", job=self.utils.senitize_path(prompt), output_path=image_name):
+            return self.downloader.download(url, image_name)
 
     def generate_and_download_sprite(self, prompt: str, save_directory: str, size: str = None,
                                      quality: str = None) -> str:
@@ -141,38 +278,97 @@ class SpriteVideoGeneration:
             str: File path of the saved image.
         """
 
+        # the index matches on the words of the prompt, which sanitizing would run together
+        raw_prompt = prompt
         prompt = self.utils.senitize_path(prompt)
         size = size or self.default_size
         quality = quality or self.default_quality
-        image_url = self.get_image_url(prompt, size, quality)
-        saved_image_path = self.download_image(
-            prompt, image_url, save_directory)
+        cache_key = self.cache.make_key(self.image_model, prompt, size, quality)
+        with self.metrics.stage("cache", job=prompt) as record:
+            cached_path = self.cache.get(cache_key, self.sprite_sheet_path(prompt, save_directory))
+            record.update(hit=bool(cached_path), output_path=cached_path)
+        if cached_path:
+            return cached_path
+        reused_path = self.reuse_sprite(raw_prompt, save_directory)
+        if reused_path:
+            return reused_path
+
+        if self.response_format == "b64_json":
+            image = self.generate_image(prompt, size, quality, response_format="b64_json")
+            image_name = self.sprite_sheet_path(prompt, save_directory)
+            with self.metrics.stage("download", job=prompt, output_path=image_name, inline=True):
+                saved_image_path = self.downloader.save_base64(image.b64_json, image_name)
+        else:
+            image_url = self.get_image_url(prompt, size, quality)
+            saved_image_path = self.download_image(
+                prompt, image_url, save_directory)
+        self.cache.put(cache_key, saved_image_path, model=self.image_model, prompt=prompt, size=size,
+                       quality=quality)
+        if self.sprite_index is not None:
+            self.sprite_index.add(saved_image_path, raw_prompt)
 
         return saved_image_path
 
-    def extract_sprites(self, row, col):
+    def reuse_sprite(self, prompt: str, save_directory: str):
 
         """
-        Extract sprites from the sprite sheet and store them in the sprites list.
+        Copy the closest indexed sprite sheet to the path of the prompt, when reuse is enabled and one is close enough.
 
         Args:
-            rows (int): Number of rows in the sprite sheet.
-            cols (int): Number of columns in the sprite sheet.
+            prompt (str): Unsanitized prompt of the sheet that would be generated.
+            save_directory (str): Directory the sheet is saved in.
+
+        Returns:
+            str: File path of the reused sheet, or None when a new one has to be generated.
+        """
+
+        if self.sprite_index is None or self.reuse_threshold is None:
+            return None
+        job = self.utils.senitize_path(prompt)
+        with self.metrics.stage("reuse", job=job) as record:
+            matches = self.sprite_index.nearest(prompt, threshold=self.reuse_threshold)
+            record.update(hit=bool(matches))
+            if not matches:
+                return None
+            match = matches[0]
+            image_name = self.sprite_sheet_path(prompt, save_directory)
+            if os.path.abspath(match["path"]) != os.path.abspath(image_name):
+                if match["path"].lower().endswith(".png"):
+                    shutil.copyfile(match["path"], image_name)
+                else:
+                    from PIL import Image
+
+                    with Image.open(match["path"]) as image:
+                        image.save(image_name)
+            record.update(source=match["path"], similarity=round(match["similarity"], 3), output_path=image_name)
+        print(f"Reusing {match['path']} for {job} (similarity {match['similarity']:.2f})")
+        return image_name
+
+    def extract_sprites(self, row, col):
+
         """
+        Extract sprites from the sprite sheet into the frame store.
+
+        The frames are views into the decoded sheet; nothing is copied until output. With a
+        compositor, all frames are blended over its background in one batch right here, so every
+        output (GIF, MP4 or stream encode) sees the composited frames.
 
-        spritesheet = Image.open(self.spritesheet_path)
-        self.sprite_width = spritesheet.width // col
-        self.sprite_height = spritesheet.height // row
+        Args:
+            row (int): Number of rows in the sprite sheet.
+            col (int): Number of columns in the sprite sheet.
+        """
 
-        for row in range(self.rows):
-            for col in range(self.cols):
-                left = col * self.sprite_width
-                upper = row * self.sprite_height
-                right = (col + 1) * self.sprite_width
-                lower = (row + 1) * self.sprite_height
+        with self.metrics.stage("extract", job=self._job_name(), input_path=self.spritesheet_path) as record:
+            self.sprites.load(self.spritesheet_path, row, col)
+            record["frames"] = len(self.sprites)
+        if self.compositor is not None:
+            with self.metrics.stage("composite", job=self._job_name(), frames=len(self.sprites)):
+                self.sprites.load_frames(self.compositor.composite(self.sprites.stack()), col)
+        self.sprite_width = self.sprites.cell_width
+        self.sprite_height = self.sprites.cell_height
 
-                sprite = spritesheet.crop((left, upper, right, lower))
-                self.sprites.append(sprite)
+    def _job_name(self) -> str:
+        return os.path.splitext(os.path.basename(self.spritesheet_path))[0]
 
     def create_animation(self, output_path: str, duration: int = 150, loop: int = 0):
 
@@ -191,18 +387,26 @@ class SpriteVideoGeneration:
         if not self.sprites:
             raise ValueError("No sprites found in the sprite sheet.")
         output_path = self.utils.senitize_path(output_path)
-        self.sprites[0].save(
-            output_path,
-            save_all=True,
-            append_images=self.sprites[1:],
-            optimize=False,
-            duration=duration,
-            loop=loop
-        )
+        with self.metrics.stage("gif", job=self._job_name(), frames=len(self.sprites), output_path=output_path):
+            if self.gif_writer is not None:
+                self.gif_writer.write(self.sprites.stack(), output_path, duration=duration, loop=loop)
+                return
+            frames = self.sprites.pil_frames()
+            frames[0].save(
+                output_path,
+                save_all=True,
+                append_images=frames[1:],
+                optimize=False,
+                duration=duration,
+                loop=loop
+            )
     
     def get_sprite_details(self, gemini_prompt, image_path):
         """
-        Generate Markdown content based on a prompt and an image with retries GEMINI.
+        Detect the rows and columns of a sprite sheet.
+
+        The grid is detected locally first; the Gemini model is only asked (with retries)
+        when the local detection is not confident enough.
 
         Parameters:
             - gemini_prompt (str): The Gemini prompt for content generation.
@@ -214,58 +418,203 @@ class SpriteVideoGeneration:
         Raises:
             Exception: Raises the last encountered exception if max_attempts are exhausted.
         """
-        for attempt in range(self.max_tries):
-            try:
-                image_path = self.utils.senitize_path(image_path)
-                img = Image.open(image_path)
-                response = self.model.generate_content([gemini_prompt, img], stream=True)
-                response.resolve()
-                numbers = re.findall(r'\d+', response.text)
-                rows = int(numbers[0]) if numbers else 0
-                columns = int(numbers[1]) if len(numbers) > 1 else 0
-                print(rows, columns)
-                return rows, columns
-            except Exception as e:
-                print(f"Attempt {attempt} failed. Error: {e}")
-                if attempt == self.max_tries:
-                    raise
-
-    def loop_and_convert_into_mp4(self, input_gif, output_path):
+        image_path = self.utils.senitize_path(image_path)
+        job = os.path.splitext(os.path.basename(image_path))[0]
+        with self.metrics.stage("grid", job=job, input_path=image_path) as record:
+            grid = self.grid_detector.detect(image_path)
+            record["confidence"] = grid["confidence"]
+        if grid["confidence"] >= self.grid_confidence_threshold:
+            print(grid["rows"], grid["cols"])
+            return grid["rows"], grid["cols"]
+
+        with self.metrics.stage("gemini", job=job, input_path=image_path):
+            rows, columns = self.scheduler.call("gemini", self._ask_sprite_grid, gemini_prompt, image_path,
+                                                key=("grid", gemini_prompt, image_path))
+        print(rows, columns)
+        return rows, columns
+
+    def _ask_sprite_grid(self, gemini_prompt, image_path):
+        from PIL import Image
+
+        with Image.open(image_path) as img:
+            # retry=None turns off the SDK's own retry, RequestScheduler retries the whole call
+            response = self.model.generate_content([gemini_prompt, img], stream=True,
+                                                   request_options={"retry": None})
+            response.resolve()
+        numbers = re.findall(r'\d+', response.text)
+        if len(numbers) < 2 or int(numbers[0]) == 0 or int(numbers[1]) == 0:
+            raise ValueError(f"Could not read rows and columns from Gemini response: {response.text!r}")
+        return int(numbers[0]), int(numbers[1])
+
+    def loop_and_convert_into_mp4(self, input_gif, output_path, encoder_profile=None):
 
         """
         Convert a GIF file to an MP4 file with a specified target duration.
 
+        With stream_copy_loop set, a single cycle of the GIF is encoded (one GOP per cycle) and
+        repeated up to target_duration by the concat demuxer, so the encode cost does not grow
+        with the output length. With dedupe_frames set, the GIF frames are read with their own
+        timing and encoded as variable frame rate video.
+
         Parameters:
             - input_gif (str): Path to the input GIF file.
             - output_path (str): Path to save the output MP4 file.
+            - encoder_profile: EncoderProfile or profile name for this job, the default profile when None.
 
         Raises:
             - ValueError: If the input GIF file or output path is invalid.
             - IOError: If there is an issue reading or writing the video files.
-            - Exception: For any other unexpected errors during the conversion process.
+            - Exception: For any other unexpected errors during the conversion process. Errors are
+              printed and re-raised, so later stages never run on a missing file.
         """
 
         try:
 
             input_gif = self.utils.senitize_path(input_gif)
             output_path = self.utils.senitize_path(output_path)
-            original_clip = VideoFileClip(input_gif)
-            original_duration = original_clip.duration
-            self.output_mp4 = output_path
-            num_repeats = int(self.target_duration /
-                              original_duration) + 1
-            video_clips = []
-            for _ in range(num_repeats):
-                video_clips.append(original_clip)
-            final_clip = concatenate_videoclips(video_clips)
-            final_clip = final_clip.subclip(0, self.target_duration)
-            final_clip.write_videofile(
-                self.output_mp4, codec="libx264", audio_codec="aac")
+            profile = EncoderProfile.get(encoder_profile) if encoder_profile else self.encoder_profile
+            with self.metrics.stage("mp4", job=self._job_name(), input_path=input_gif,
+                                    output_path=output_path) as record:
+                if self.deduplicator is not None:
+                    frames, durations = self._gif_frames(input_gif)
+                    self._encode_deduplicated(frames, durations, output_path, profile, record)
+                    self.output_mp4 = output_path
+                    return
+
+                if self.stream_copy_loop:
+                    cycle_path = self._cycle_path(output_path)
+                    try:
+                        record["frames"], cycle_duration = self.ffmpeg.encode_gif_cycle(input_gif, cycle_path,
+                                                                                        profile.codec_args())
+                        self.ffmpeg.loop_by_stream_copy(cycle_path, output_path, cycle_duration,
+                                                        self.target_duration)
+                    finally:
+                        if os.path.exists(cycle_path):
+                            os.remove(cycle_path)
+                    self.output_mp4 = output_path
+                    return
+
+                from moviepy.video.io.VideoFileClip import VideoFileClip
+                from moviepy.video.compositing.concatenate import concatenate_videoclips
+
+                original_clip = VideoFileClip(input_gif)
+                original_duration = original_clip.duration
+                self.output_mp4 = output_path
+                num_repeats = int(self.target_duration /
+                                  original_duration) + 1
+                video_clips = []
+                for _ in range(num_repeats):
+                    video_clips.append(original_clip)
+                final_clip = concatenate_videoclips(video_clips)
+                final_clip = final_clip.subclip(0, self.target_duration)
+                final_clip.write_videofile(
+                    self.output_mp4, audio_codec="aac", **profile.moviepy_options())
+                record["frames"] = int(self.target_duration * final_clip.fps)
         except Exception as e:
             print(f"Error: {e}")
+            raise
+
+    def stream_sprites_to_mp4(self, output_path: str, frame_duration: int = 150, encoder_profile=None):
+
+        """
+        Encode the extracted sprites straight into a looped MP4 without an intermediate GIF.
+
+        The frames are piped to ffmpeg as raw RGB at 1000 / frame_duration fps and cycled until
+        target_duration is reached, so there is no GIF palette quantization and no decode step.
+        With stream_copy_loop set, only one cycle is encoded and repeated with a stream copy.
+        With dedupe_frames set, repeated frames are merged and the video has a variable frame rate.
+
+        Parameters:
+            - output_path (str): Path to save the output MP4 file.
+            - frame_duration (int): Duration for each frame in milliseconds.
+            - encoder_profile: EncoderProfile or profile name for this job, the default profile when None.
+
+        Raises:
+            - ValueError: If there are no sprites to encode.
+            - IOError: If the encoder fails.
+        """
+
+        if not self.sprites:
+            self.extract_sprites(self.rows, self.cols)
+
+        if not self.sprites:
+            raise ValueError("No sprites found in the sprite sheet.")
+        import numpy as np
+
+        output_path = self.utils.senitize_path(output_path)
+        # yuv420p needs even dimensions
+        height = self.sprite_height - self.sprite_height % 2
+        width = self.sprite_width - self.sprite_width % 2
+        frames = [np.ascontiguousarray(frame[:height, :width, :3]) for frame in self.sprites]
+        frame_rate = f"1000/{frame_duration}"
+        profile = EncoderProfile.get(encoder_profile) if encoder_profile else self.encoder_profile
+        with self.metrics.stage("mp4", job=self._job_name(), output_path=output_path, streamed=True) as record:
+            if self.deduplicator is not None:
+                self._encode_deduplicated(frames, [frame_duration / 1000.0] * len(frames), output_path, profile,
+                                          record)
+            elif self.stream_copy_loop:
+                cycle_path = self._cycle_path(output_path)
+                # no B-frames, so the stream copy is cut at target_duration
+                codec_args = profile.codec_args(keyint=len(frames)) + ["-bf", "0"]
+                try:
+                    record["frames"] = self.ffmpeg.write_frames(frames, cycle_path, width, height, frame_rate,
+                                                                codec_args=codec_args)
+                    self.ffmpeg.loop_by_stream_copy(cycle_path, output_path, len(frames) * frame_duration / 1000.0,
+                                                    self.target_duration)
+                finally:
+                    if os.path.exists(cycle_path):
+                        os.remove(cycle_path)
+            else:
+                frame_count = math.ceil(self.target_duration * 1000 / frame_duration)
+                record["frames"] = self.ffmpeg.write_frames(itertools.islice(itertools.cycle(frames), frame_count),
+                                                            output_path, width, height, frame_rate,
+                                                            codec_args=profile.codec_args())
+        self.output_mp4 = output_path
+
+    @staticmethod
+    def _cycle_path(output_path: str) -> str:
+        # unique per render, so renders of the same output never share or remove each other's cycle
+        fd, cycle_path = tempfile.mkstemp(suffix=".cycle.mp4", dir=os.path.dirname(os.path.abspath(output_path)))
+        os.close(fd)
+        return cycle_path
+
+    def _encode_deduplicated(self, frames: list, durations: list, output_path: str, profile: EncoderProfile,
+                             record: dict):
+        frames, durations = self.deduplicator.dedupe(frames, durations)
+        record["unique_frames"] = len(frames)
+        if not self.stream_copy_loop:
+            record["frames"] = self.ffmpeg.write_frames_vfr(frames, durations, output_path, profile.codec_args(),
+                                                            total_duration=self.target_duration)
+            return
+
+        # one GOP per cycle and no B-frames, so the trailing frame of the cycle can be cut on copy
+        cycle_path = self._cycle_path(output_path)
+        codec_args = profile.codec_args(keyint=len(frames) + 1) + ["-bf", "0"]
+        try:
+            record["frames"] = self.ffmpeg.write_frames_vfr(frames, durations, cycle_path, codec_args)
+            self.ffmpeg.loop_by_stream_copy(cycle_path, output_path, sum(durations), self.target_duration,
+                                            trim_cycles=True)
+        finally:
+            if os.path.exists(cycle_path):
+                os.remove(cycle_path)
+
+    @staticmethod
+    def _gif_frames(input_gif: str) -> tuple:
+        import numpy as np
+        from PIL import Image, ImageSequence
+
+        frames, durations = [], []
+        with Image.open(input_gif) as gif:
+            # yuv420p needs even dimensions
+            width, height = gif.width - gif.width % 2, gif.height - gif.height % 2
+            for frame in ImageSequence.Iterator(gif):
+                frames.append(np.ascontiguousarray(np.asarray(frame.convert("RGB"))[:height, :width]))
+                durations.append(frame.info.get("duration", 100) / 1000.0)
+        return frames, durations
 
     def generate_sprite_and_animation(self, prompt: str, save_directory: str, gemini_prompt: str,
-                                      animation_duration: int = 150, animation_loop: int = 0):
+                                      animation_duration: int = 150, animation_loop: int = 0,
+                                      stream_encode: bool = False, write_gif: bool = True):
 
         """
         Generate a sprite sheet, markdown content, animation, and video from prompts.
@@ -276,9 +625,11 @@ class SpriteVideoGeneration:
         - gemini_prompt (str): The prompt for generating markdown content.
         - gemini_duration (int, optional): Duration of the animation in seconds (default is 150).
         - gemini_loop (int, optional): Number of times to loop the animation (default is 0).
+        - stream_encode (bool, optional): Encode the MP4 straight from the sprites instead of from the GIF.
+        - write_gif (bool, optional): Also write the GIF when stream_encode is set (default is True).
 
         Returns:
-        str: The generated markdown content.
+        str: Path of the looped MP4 file.
 
         Raises:
         - Any exceptions that might be raised by the underlying functions, such as file I/O errors or conversion errors.
@@ -286,21 +637,95 @@ class SpriteVideoGeneration:
 
         sprite_path = self.generate_and_download_sprite(prompt, save_directory)
         rows, cols = self.get_sprite_details(gemini_prompt, sprite_path)
+        return self.animate_sprite(sprite_path, rows, cols, prompt, save_directory,
+                                   animation_duration=animation_duration, animation_loop=animation_loop,
+                                   stream_encode=stream_encode, write_gif=write_gif)
+
+    def animate_sprite(self, sprite_path: str, rows: int, cols: int, prompt: str, save_directory: str,
+                       animation_duration: int = 150, animation_loop: int = 0, stream_encode: bool = False,
+                       write_gif: bool = True, encoder_profile=None, variant: str = None) -> str:
+
+        """
+        Run the local (CPU-bound) stages for an already downloaded sprite sheet.
+
+        Args:
+            sprite_path (str): Path to the downloaded sprite sheet.
+            rows (int): Number of rows in the sprite sheet.
+            cols (int): Number of columns in the sprite sheet.
+            prompt (str): Prompt the sprite sheet was generated from, used for the output folder.
+            save_directory (str): Directory the generated files are saved in.
+            animation_duration (int): Duration for each frame in milliseconds.
+            animation_loop (int): Number of loops for the animation (use 0 for infinite loop).
+            stream_encode (bool): Encode the MP4 straight from the sprites instead of from the GIF.
+            write_gif (bool): Also write the GIF when stream_encode is set.
+            encoder_profile: EncoderProfile, profile name or dict of settings for this job, the default when None.
+            variant (str): Suffix of the GIF and MP4 names, so renders of one prompt with different settings
+                do not overwrite each other.
+
+        Returns:
+            str: Path of the looped MP4 file.
+        """
+
         self.rows = rows
         self.cols = cols
         self.spritesheet_path = sprite_path
-        self.create_animation(os.path.join(
-            save_directory + "/" + prompt, f"{prompt}.gif"), duration=animation_duration, loop=animation_loop)
-        self.loop_and_convert_into_mp4(os.path.join(
-            save_directory + "/" + prompt, f"{prompt}.gif"),
-            (save_directory + "/" + prompt + f"/Extended_{prompt}.mp4"))
+        self.sprites.reset()
+        name = prompt if variant is None else f"{prompt}_{variant}"
+        gif_path = os.path.join(save_directory + "/" + prompt, f"{name}.gif")
+        mp4_path = save_directory + "/" + prompt + f"/Extended_{name}.mp4"
+        if stream_encode:
+            self.stream_sprites_to_mp4(mp4_path, frame_duration=animation_duration, encoder_profile=encoder_profile)
+            if write_gif:
+                self.create_animation(gif_path, duration=animation_duration, loop=animation_loop)
+            return self.output_mp4
+
+        self.create_animation(gif_path, duration=animation_duration, loop=animation_loop)
+        self.loop_and_convert_into_mp4(gif_path, mp4_path, encoder_profile=encoder_profile)
+        return self.output_mp4
 
     def merge_and_resize_videos(self, video_paths, output_path, target_width, target_height):
-        clips = []
-        for path in video_paths:
-            path = self.utils.senitize_path(path=path)
-            clip = VideoFileClip(path).resize(newsize=(target_width, target_height))
-            clips.append(clip)
-
-        final_clip = concatenate_videoclips(clips)
-        final_clip.write_videofile(output_path)
+
+        """
+        Merge videos into one file resized to the target size.
+
+        Inputs that already share the target stream parameters are joined with a stream copy;
+        otherwise every input is normalized in its own ffmpeg process and then joined.
+
+        Parameters:
+            - video_paths (list): Paths of the input videos, in playback order.
+            - output_path (str): Path to save the merged video.
+            - target_width (int): Width of the merged video.
+            - target_height (int): Height of the merged video.
+
+        Returns:
+            str: Path of the merged video.
+        """
+
+        video_paths = [self.utils.senitize_path(path=path) for path in video_paths]
+        with self.metrics.stage("merge", output_path=output_path, inputs=len(video_paths),
+                                bytes_read=sum(os.path.getsize(path) for path in video_paths if os.path.isfile(path))):
+            return self.merger.merge(video_paths, output_path, target_width, target_height)
+
+    def merge_renditions(self, video_paths, output_directory, heights=VideoMerger.LADDER_HEIGHTS, name="video"):
+
+        """
+        Merge videos into a 480p/720p/1080p style ladder and a poster, decoding the inputs once.
+
+        Parameters:
+            - video_paths (list): Paths of the input videos, in playback order.
+            - output_directory (str): Directory of the renditions, the poster and the manifest.
+            - heights (tuple): Rendition heights.
+            - name (str): Base name of the output files.
+
+        Returns:
+            dict: Manifest of the produced files, as written to {name}.json.
+        """
+
+        video_paths = [self.utils.senitize_path(path=path) for path in video_paths]
+        with self.metrics.stage("renditions", inputs=len(video_paths), renditions=len(heights),
+                                bytes_read=sum(os.path.getsize(path) for path in video_paths
+                                               if os.path.isfile(path))) as record:
+            manifest = self.merger.merge_ladder(video_paths, output_directory, heights=heights, name=name)
+            record["bytes_written"] = (sum(rendition["bytes"] for rendition in manifest["renditions"])
+                                       + manifest.get("poster", {}).get("bytes", 0))
+            return manifest
@@ -0,0 +1,437 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from VideoGeneration.batchGeneration import BatchSpriteVideoGeneration, _init_render_worker
+from VideoGeneration.jobGraph import SpriteVideoPipeline
+from utilities.instrumentation.instrumentation import PipelineMetrics
+
+DEFAULT_GEMINI_PROMPT = ("Please tell me how many rows and columns in this sprite sheet, tell me only rows and "
+                         "columns no extra stuff please, answer me like that [rows] [columns].")
+
+
+def _init_worker_process(generator_kwargs: dict):
+    """
+    Render process initializer that leaves Ctrl+C to the parent, which drains jobs before exiting.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _init_render_worker(generator_kwargs)
+
+
+class SpoolQueue:
+    """
+    Job queue backed by a spool directory.
+
+    Each job is a JSON file that moves between the ``incoming``, ``running``, ``done`` and
+    ``failed`` folders. Claiming a job is an atomic rename, so several workers can share a
+    spool without locking, and a job is never lost if a worker is killed mid-job. A claim is
+    owned by the worker that made it: the owner is recorded next to the job and keeps the
+    claim alive by touching the job file, and only claims whose owner died or stopped
+    touching them for lease_seconds are put back by recover.
+
+    Attributes:
+        directory (str): Root of the spool.
+        lease_seconds (float): Time without a heartbeat after which a claim counts as abandoned.
+        owner (dict): Identity written into the claims of this queue object.
+    """
+
+    STATES = ("incoming", "running", "done", "failed")
+
+    def __init__(self, directory: str, lease_seconds: float = 60.0):
+        self.directory = directory
+        self.lease_seconds = lease_seconds
+        self.owner = {"pid": os.getpid(), "host": socket.gethostname(), "worker": uuid.uuid4().hex}
+        for state in self.STATES:
+            os.makedirs(os.path.join(directory, state), exist_ok=True)
+
+    def _path(self, state: str, name: str) -> str:
+        return os.path.join(self.directory, state, name)
+
+    def _owner_path(self, name: str) -> str:
+        return self._path("running", f"{os.path.splitext(name)[0]}.owner")
+
+    def _write(self, path: str, job):
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(job, f, indent=2)
+        os.replace(temp_path, path)
+
+    def submit(self, job) -> str:
+
+        """
+        Add a job to the queue.
+
+        Args:
+            job (list or dict): A video_json list, or a dict with a "video_json" key and optional
+                overrides such as "output_path" or "audio_paths".
+
+        Returns:
+            str: Name of the job file.
+        """
+
+        name = f"{time.time():.6f}-{uuid.uuid4().hex[:8]}.json"
+        self._write(self._path("incoming", name), job)
+        return name
+
+    def claim(self):
+
+        """
+        Take the oldest incoming job.
+
+        Returns:
+            tuple: Job name and job, or None when the queue is empty.
+        """
+
+        for name in sorted(os.listdir(os.path.join(self.directory, "incoming"))):
+            if not name.endswith(".json"):
+                continue
+            running_path = self._path("running", name)
+            try:
+                os.rename(self._path("incoming", name), running_path)
+            except FileNotFoundError:
+                # another worker claimed it first
+                continue
+            # the rename keeps the submit time, the lease starts now
+            os.utime(running_path)
+            self._write(self._owner_path(name), self.owner)
+            try:
+                with open(running_path) as f:
+                    return name, json.load(f)
+            except ValueError as e:
+                self.finish(name, {"error": f"Invalid job file: {e}"}, failed=True)
+        return None
+
+    def finish(self, name: str, result: dict, failed: bool = False):
+
+        """
+        Move a running job to done or failed, recording its result next to the job.
+
+        Args:
+            name (str): Name of the job file.
+            result (dict): Result fields, stored under "result".
+            failed (bool): Whether the job failed.
+        """
+
+        running_path = self._path("running", name)
+        try:
+            with open(running_path) as f:
+                job = json.load(f)
+        except FileNotFoundError:
+            print(f"Job {name} is no longer claimed by this worker, recording its result anyway")
+            job = None
+        except ValueError:
+            job = None
+        self._write(self._path("failed" if failed else "done", name), {"job": job, "result": result})
+        for path in (running_path, self._owner_path(name)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def heartbeat(self, names):
+
+        """
+        Renew the lease of jobs claimed by this worker.
+
+        Args:
+            names (iterable): Names of the claimed job files.
+        """
+
+        for name in names:
+            try:
+                os.utime(self._path("running", name))
+            except FileNotFoundError:
+                pass
+
+    def is_stale(self, name: str) -> bool:
+
+        """
+        Whether a running job was abandoned: its owner process on this host is gone, or its
+        lease was not renewed for lease_seconds.
+        """
+
+        try:
+            stat = os.stat(self._path("running", name))
+        except FileNotFoundError:
+            return False
+        try:
+            with open(self._owner_path(name)) as f:
+                owner = json.load(f)
+        except (OSError, ValueError):
+            owner = {}
+        if owner.get("worker") == self.owner["worker"]:
+            return False
+        if owner.get("host") == self.owner["host"] and owner.get("pid"):
+            try:
+                os.kill(owner["pid"], 0)
+            except ProcessLookupError:
+                return True
+            except PermissionError:
+                pass
+        # ctime also moves on the claiming rename, before the owner is written
+        return time.time() - max(stat.st_mtime, stat.st_ctime) > self.lease_seconds
+
+    def recover(self) -> int:
+
+        """
+        Put abandoned jobs back into incoming; jobs claimed by live workers are left alone.
+
+        Returns:
+            int: Number of recovered jobs.
+        """
+
+        recovered = 0
+        for name in os.listdir(os.path.join(self.directory, "running")):
+            if not name.endswith(".json") or not self.is_stale(name):
+                continue
+            try:
+                os.rename(self._path("running", name), self._path("incoming", name))
+            except FileNotFoundError:
+                # finished or recovered by another worker meanwhile
+                continue
+            try:
+                os.remove(self._owner_path(name))
+            except FileNotFoundError:
+                pass
+            recovered += 1
+        return recovered
+
+    def counts(self) -> dict:
+        return {state: sum(name.endswith(".json") for name in os.listdir(os.path.join(self.directory, state)))
+                for state in self.STATES}
+
+
+class SpriteVideoWorker:
+    """
+    Long-running worker that renders jobs from a spool directory.
+
+    The OpenAI client, the Gemini model, the caches and the render processes are created
+    once and stay warm across jobs, so a job only pays for its own stages. Every job runs
+    through SpriteVideoPipeline with a manifest shared by all jobs. SIGINT or SIGTERM stops
+    claiming new jobs and exits once the running ones have finished. The current state is
+    written to ``status.json`` in the spool after every change.
+
+    Attributes:
+        batch (BatchSpriteVideoGeneration): Warm generator and worker settings.
+        queue (SpoolQueue): Job queue.
+        max_jobs (int): Number of jobs rendered at the same time.
+        poll_interval (float): Seconds between checks of an empty queue.
+        defaults (dict): Pipeline arguments used when a job does not set them.
+    """
+
+    def __init__(self, batch: BatchSpriteVideoGeneration, spool_directory: str, max_jobs: int = 2,
+                 poll_interval: float = 1.0, **defaults):
+        self.batch = batch
+        self.queue = SpoolQueue(spool_directory)
+        self.max_jobs = max_jobs
+        self.poll_interval = poll_interval
+        self.defaults = dict(save_directory=os.path.join(spool_directory, "output"),
+                             gemini_prompt=DEFAULT_GEMINI_PROMPT, target_width=480, target_height=480)
+        self.defaults.update(defaults)
+        self.status_path = os.path.join(spool_directory, "status.json")
+        self.metrics_path = os.path.join(spool_directory, "metrics.jsonl")
+        self.stage_totals = {}
+        self.started = time.time()
+        self.running = {}
+        self.completed = 0
+        self.failed = 0
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        # the main loop and every finishing job write status.json through the same temp file
+        self._status_lock = threading.Lock()
+
+    def stop(self, *_):
+
+        """
+        Stop claiming jobs; running jobs are finished before run() returns.
+        """
+
+        if not self._stopping.is_set():
+            print("Stopping after the running jobs finish...")
+        self._stopping.set()
+
+    def status(self) -> dict:
+        with self._lock:
+            running = {name: round(time.time() - started, 1) for name, started in self.running.items()}
+            completed, failed = self.completed, self.failed
+            stage_totals = {stage: dict(totals) for stage, totals in self.stage_totals.items()}
+        return {
+            "pid": os.getpid(),
+            "state": "stopping" if self._stopping.is_set() else "running",
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "running": running,
+            "completed": completed,
+            "failed": failed,
+            "queue": self.queue.counts(),
+            "stages": stage_totals,
+            "updated": time.time(),
+        }
+
+    def flush_metrics(self):
+
+        """
+        Move the collected stage records to metrics.jsonl and fold them into the running totals,
+        so a long-running worker does not keep every record in memory.
+        """
+
+        drained = PipelineMetrics()
+        drained.extend(self.batch.generator.metrics.drain())
+        drained.write_jsonl(self.metrics_path)
+        with self._lock:
+            for stage, totals in drained.totals().items():
+                merged = self.stage_totals.setdefault(stage, dict.fromkeys(totals, 0))
+                for key, value in totals.items():
+                    merged[key] = merged.get(key, 0) + value
+
+    def write_status(self, state: str = None):
+        temp_path = f"{self.status_path}.tmp"
+        with self._status_lock:
+            # snapshot under the lock too, so an older status never replaces a newer one
+            status = self.status()
+            if state:
+                status["state"] = state
+            with open(temp_path, "w") as f:
+                json.dump(status, f, indent=2)
+            os.replace(temp_path, self.status_path)
+
+    def process(self, name: str, job, pipeline: SpriteVideoPipeline) -> str:
+
+        """
+        Render one job.
+
+        Args:
+            name (str): Name of the job file.
+            job (list or dict): The job, see SpoolQueue.submit.
+            pipeline (SpriteVideoPipeline): Pipeline sharing the warm pools.
+
+        Returns:
+            str: Path of the final video.
+        """
+
+        options = dict(self.defaults)
+        if isinstance(job, dict):
+            options.update(job)
+        else:
+            options["video_json"] = job
+        options.setdefault("output_path", os.path.join(options["save_directory"], f"{os.path.splitext(name)[0]}.mp4"))
+        os.makedirs(options["save_directory"], exist_ok=True)
+        return pipeline.run(**options)
+
+    def _run_job(self, name: str, job, pipeline: SpriteVideoPipeline):
+        started = time.time()
+        try:
+            output_path = self.process(name, job, pipeline)
+            self.queue.finish(name, {"output_path": output_path, "seconds": time.time() - started})
+            with self._lock:
+                self.completed += 1
+        except Exception as e:
+            print(f"Error processing job {name}: {e}")
+            self.queue.finish(name, {"error": str(e), "seconds": time.time() - started}, failed=True)
+            with self._lock:
+                self.failed += 1
+        finally:
+            with self._lock:
+                self.running.pop(name, None)
+            self.flush_metrics()
+            self.write_status()
+
+    def run(self):
+
+        """
+        Process jobs until stopped by SIGINT or SIGTERM.
+        """
+
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        recovered = self.queue.recover()
+        if recovered:
+            print(f"Recovered {recovered} abandoned jobs")
+
+        with ThreadPoolExecutor(max_workers=self.batch.io_workers) as io_pool, \
+                ProcessPoolExecutor(max_workers=self.batch.cpu_workers, initializer=_init_worker_process,
+                                    initargs=(self.batch.render_kwargs,)) as cpu_pool, \
+                ThreadPoolExecutor(max_workers=self.max_jobs) as job_pool:
+            pipeline = SpriteVideoPipeline(self.batch, os.path.join(self.queue.directory, "manifest.sqlite"),
+                                           io_pool=io_pool, cpu_pool=cpu_pool)
+            print(f"Worker {os.getpid()} waiting for jobs in {self.queue.directory}")
+            self.write_status()
+            last_recover = time.time()
+            while not self._stopping.is_set():
+                claimed = None
+                with self._lock:
+                    has_capacity = len(self.running) < self.max_jobs
+                    claimed_names = list(self.running)
+                self.queue.heartbeat(claimed_names)
+                if time.time() - last_recover > self.queue.lease_seconds:
+                    # pick up the jobs of workers that died since
+                    recovered = self.queue.recover()
+                    if recovered:
+                        print(f"Recovered {recovered} abandoned jobs")
+                    last_recover = time.time()
+                if has_capacity:
+                    claimed = self.queue.claim()
+                if claimed is None:
+                    self._stopping.wait(self.poll_interval)
+                    continue
+                name, job = claimed
+                with self._lock:
+                    self.running[name] = time.time()
+                print(f"Starting job {name}")
+                job_pool.submit(self._run_job, name, job, pipeline)
+                self.write_status()
+        self.write_status(state="stopped")
+
+
+def main():
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Render sprite video jobs from a spool directory.")
+    parser.add_argument("--spool", default="spool", help="Spool directory holding the job queue.")
+    subparsers = parser.add_subparsers(dest="command")
+    run_parser = subparsers.add_parser("run", help="Process jobs until stopped (the default).")
+    run_parser.add_argument("--jobs", type=int, default=2, help="Number of jobs rendered at the same time.")
+    run_parser.add_argument("--cpu-workers", type=int, default=None, help="Number of render processes.")
+    run_parser.add_argument("--stream-encode", action="store_true", help="Encode MP4s straight from the sprites.")
+    run_parser.add_argument("--stream-copy-loop", action=argparse.BooleanOptionalAction, default=True,
+                            help="Encode one animation cycle and loop it by stream copy (on by default).")
+    submit_parser = subparsers.add_parser("submit", help="Queue a job file (a video_json list or a job dict).")
+    submit_parser.add_argument("job_file")
+    subparsers.add_parser("status", help="Print the status of the running worker and the queue.")
+    args = parser.parse_args()
+
+    if args.command == "submit":
+        with open(args.job_file) as f:
+            print(SpoolQueue(args.spool).submit(json.load(f)))
+        return
+    if args.command == "status":
+        status_path = os.path.join(args.spool, "status.json")
+        status = {}
+        if os.path.exists(status_path):
+            with open(status_path) as f:
+                status = json.load(f)
+        status["queue"] = SpoolQueue(args.spool).counts()
+        print(json.dumps(status, indent=2))
+        return
+
+    load_dotenv()
+    batch = BatchSpriteVideoGeneration(
+        api_key=os.getenv("OPENAI_API_KEY", ""),
+        organization=os.getenv("ORGANIZATION_KEY", ""),
+        gemini_api_key=os.getenv("GEMINI_API_KEY", ""),
+        max_tries=3,
+        cpu_workers=getattr(args, "cpu_workers", None),
+        stream_copy_loop=getattr(args, "stream_copy_loop", True),
+    )
+    worker = SpriteVideoWorker(batch, args.spool, max_jobs=getattr(args, "jobs", 2),
+                               stream_encode=getattr(args, "stream_encode", False))
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,136 @@
-from moviepy.video.io.VideoFileClip import VideoFileClip
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from utilities.ffmpegtools.ffmpegtools import FFmpegTools
+from utilities.instrumentation.instrumentation import pipeline_metrics
+
+VIDEO_EXTENSIONS = (".mp4", ".m4v", ".mov", ".mkv", ".webm", ".avi")
+
+# audio codecs each output container can hold without re-encoding
+COPY_CONTAINERS = {
+    ".m4a": ("aac", "alac"),
+    ".aac": ("aac",),
+    ".mp3": ("mp3",),
+    ".ogg": ("vorbis", "opus", "flac"),
+    ".opus": ("opus",),
+    ".flac": ("flac",),
+    ".wav": ("pcm_s16le", "pcm_s24le", "pcm_f32le"),
+    ".mka": ("aac", "alac", "mp3", "vorbis", "opus", "flac", "ac3", "pcm_s16le"),
+}
 
 def extract_audio(video_path, audio_output_path):
-    video_clip = VideoFileClip(video_path)
-    audio_clip = video_clip.audio
-    audio_clip.write_audiofile(audio_output_path)
-    audio_clip.close()
-    video_clip.close()
+    from moviepy.video.io.VideoFileClip import VideoFileClip
 
-if __name__ == "__main__":
-    video_file_path = "mp4_audios/JPM.mp4"  # Replace with the path to your video file
-    audio_output_path = "audios/JPM.wav"  # Replace with the desired output audio file path
+    with pipeline_metrics.stage("extract_audio", job=video_path, input_path=video_path,
+                                output_path=audio_output_path):
+        video_clip = VideoFileClip(video_path)
+        audio_clip = video_clip.audio
+        audio_clip.write_audiofile(audio_output_path)
+        audio_clip.close()
+        video_clip.close()
+
+def is_up_to_date(video_path, audio_output_path):
+    return (os.path.exists(audio_output_path) and os.path.getsize(audio_output_path) > 0
+            and os.path.getmtime(audio_output_path) >= os.path.getmtime(video_path))
+
+def demux_audio(video_path, audio_output_path, ffmpeg=None):
+    """
+    Write the audio track of a video to its own file.
+
+    The track is stream-copied when the output container can hold its codec and decoded
+    only when a format change is needed.
+
+    Args:
+        video_path (str): Path of the video.
+        audio_output_path (str): Path of the audio file, its extension selects the container.
+        ffmpeg (FFmpegTools): ffmpeg wrapper to use.
+
+    Returns:
+        str: "copy" or "decode", depending on how the track was written.
+
+    Raises:
+        ValueError: If the video has no audio track.
+    """
+    ffmpeg = ffmpeg or FFmpegTools()
+    codec = ffmpeg.probe(video_path)["audio_codec"]
+    if codec is None:
+        raise ValueError(f"{video_path} has no audio track.")
 
-    extract_audio(video_file_path, audio_output_path)
+    base, extension = os.path.splitext(audio_output_path)
+    mode = "copy" if codec in COPY_CONTAINERS.get(extension.lower(), ()) else "decode"
+    codec_args = ["-c:a", "copy"] if mode == "copy" else []
+    # write next to the target and rename, so an interrupted run never looks up to date
+    temp_path = f"{base}.part{extension}"
+    with pipeline_metrics.stage("extract_audio", job=video_path, input_path=video_path,
+                                output_path=temp_path, mode=mode):
+        try:
+            ffmpeg.run(["-i", video_path, "-vn", "-map", "0:a:0", *codec_args, temp_path])
+            os.replace(temp_path, audio_output_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    return mode
+
+def _reset_worker_metrics():
+    # forked workers inherit the records of this process, so they start from an empty log
+    pipeline_metrics.drain()
+
+def _extract_job(video_path, audio_output_path):
+    try:
+        return demux_audio(video_path, audio_output_path), pipeline_metrics.drain()
+    except Exception:
+        pipeline_metrics.drain()
+        raise
+
+def extract_audio_batch(source, output_directory, extension=".wav", workers=None, force=False, mp_context=None):
+    """
+    Extract the audio track of every video in a directory or glob on a process pool.
+
+    Args:
+        source (str): Directory of videos, or a glob pattern such as "mp4_audios/*.mp4".
+        output_directory (str): Directory of the audio files, named after their videos.
+        extension (str): Extension of the audio files, which selects the container.
+        workers (int): Number of worker processes, defaults to the number of cores.
+        force (bool): Extract again even when an up-to-date audio file exists.
+        mp_context: multiprocessing context of the worker pool, the platform default when None.
+
+    Returns:
+        dict: Video path to audio path for every video that has an up-to-date audio file.
+    """
+    if os.path.isdir(source):
+        video_paths = [os.path.join(source, name) for name in sorted(os.listdir(source))
+                       if name.lower().endswith(VIDEO_EXTENSIONS)]
+    else:
+        video_paths = sorted(glob.glob(source))
+    os.makedirs(output_directory, exist_ok=True)
+
+    outputs = {}
+    jobs = {}
+    for video_path in video_paths:
+        name = os.path.splitext(os.path.basename(video_path))[0]
+        audio_output_path = os.path.join(output_directory, name + extension)
+        if not force and is_up_to_date(video_path, audio_output_path):
+            outputs[video_path] = audio_output_path
+        else:
+            jobs[video_path] = audio_output_path
+    print(f"Extracting audio from {len(jobs)} videos, {len(outputs)} already up to date")
+    if not jobs:
+        return outputs
+
+    # a module level initializer, a bound method would pickle the metrics lock under spawn
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, mp_context=mp_context,
+                             initializer=_reset_worker_metrics) as pool:
+        futures = {pool.submit(_extract_job, video_path, audio_output_path): video_path
+                   for video_path, audio_output_path in jobs.items()}
+        for future, video_path in futures.items():
+            try:
+                _, records = future.result()
+                pipeline_metrics.extend(records)
+                outputs[video_path] = jobs[video_path]
+            except Exception as e:
+                print(f"Error extracting audio from {video_path}: {e}")
+    return outputs
+
+if __name__ == "__main__":
+    extract_audio_batch("mp4_audios", "audios", extension=".wav")
@@ -1,32 +1,37 @@
-from moviepy.editor import VideoFileClip, AudioFileClip
 import os
-from pychorus import find_and_output_chorus
 import uuid
 from pydub import AudioSegment
+from utilities.audiotools.audiotools import AudioTools
+from utilities.choruscache.choruscache import ChorusCache
+from utilities.instrumentation.instrumentation import pipeline_metrics
+
+CHORUS_LENGTH = 15
+
+chorus_cache = ChorusCache()
 
 def loop_chorus_segment(chorus_file_path:str,original_audio_path:str,loop_duration:int):
-        audio_clip = None
-        
-        if os.path.exists(chorus_file_path):
-            audio = AudioSegment.from_mp3(chorus_file_path)
+        if chorus_file_path and os.path.exists(chorus_file_path):
+            audio = AudioSegment.from_file(chorus_file_path)
         else:
             print(f"original audio path {original_audio_path}")
-            audio = AudioSegment.from_mp3(original_audio_path)
-        
-        if len(audio)/1000.0>loop_duration:
-            clipped_audio = audio[:loop_duration*1000]
-            audio_clip = clipped_audio 
-        else:
-            looped_audio = audio
-            loop_duration = int(loop_duration)
-            for i in range(loop_duration):
-                looped_audio +=audio 
-            # Trim the audio to the exact duration if needed 
-            looped_audio = looped_audio[:loop_duration*1000]
-            audio_clip = looped_audio
-
-        return audio_clip
+            audio = AudioSegment.from_file(original_audio_path)
+
+        # tile the samples up to the exact duration in one allocation
+        return AudioTools.tile_to_duration(audio, loop_duration)
+
+def load_chorus(audio_path:str,clip_length:float=CHORUS_LENGTH):
+        # chorus offsets are cached by audio content, so only a new track runs the analysis
+        chorus_start = chorus_cache.chorus_start(audio_path, clip_length)
+        audio = AudioSegment.from_file(audio_path)
+        if chorus_start is None:
+            return audio
+        return audio[int(chorus_start*1000):int((chorus_start+clip_length)*1000)]
+
 def add_audio_to_video(video_path,audio_path,temp_dir="/Users/mac/Desktop/Loss_function/audio_video_merge_videos",new_video_dir= "/Users/mac/Desktop/Loss_function/audio_video_merge_videos"):
+        # moviepy takes seconds to import, so it is loaded by the stage that uses it
+        from moviepy.video.io.VideoFileClip import VideoFileClip
+        from moviepy.audio.io.AudioFileClip import AudioFileClip
+
         video = VideoFileClip(video_path)
 
         # remove sound if sound already present in video        
@@ -39,18 +44,15 @@ def add_audio_to_video(video_path,audio_path,temp_dir="/Users/mac/Desktop/Loss_f
         if not os.path.exists(new_video_dir):
             os.mkdir(new_video_dir)
 
-        chorus_file_path = os.path.join(temp_dir,"temp.mp3")
-        
-
-        # will create a temp chorus file (.mp3)
-        x = find_and_output_chorus(audio_path,chorus_file_path)
+        with pipeline_metrics.stage("chorus", job=audio_path, input_path=audio_path):
+            chorus = load_chorus(audio_path)
         
         loop_time = video.duration
         print(f"audio path {audio_path}")
-        looped_audio = loop_chorus_segment(chorus_file_path,loop_duration=loop_time,original_audio_path=audio_path)
-
         looped_audio_path = os.path.join(temp_dir,"looped_audio.mp3")
-        looped_audio.export(looped_audio_path,format='mp3')
+        with pipeline_metrics.stage("audio_loop", job=audio_path, output_path=looped_audio_path):
+            looped_audio = AudioTools.tile_to_duration(chorus, loop_time)
+            looped_audio.export(looped_audio_path,format='mp3')
 
         new_audio = AudioFileClip(looped_audio_path)
         video_with_audio = video.set_audio(new_audio)
@@ -60,11 +62,12 @@ def add_audio_to_video(video_path,audio_path,temp_dir="/Users/mac/Desktop/Loss_f
 
         print("new video path = ",video_with_audio)
 
-        video_with_audio.write_videofile(new_video_path)
+        with pipeline_metrics.stage("audio_mux", job=video_path, input_path=video_path,
+                                    output_path=new_video_path) as record:
+            video_with_audio.write_videofile(new_video_path)
+            record["frames"] = int(video.duration * video.fps)
 
         # delete temp file
-        if os.path.exists(chorus_file_path): 
-            os.remove(chorus_file_path)
         if os.path.exists(looped_audio_path):
             os.remove(looped_audio_path)
             
@@ -73,4 +76,6 @@ def add_audio_to_video(video_path,audio_path,temp_dir="/Users/mac/Desktop/Loss_f
         return new_video_path
 
 
-add_audio_to_video("/Users/mac/Desktop/Loss_function/videos/4.mp4","audios/C.wav")
\ No newline at end of file
+
+if __name__ == "__main__":
+    add_audio_to_video("/Users/mac/Desktop/Loss_function/videos/4.mp4","audios/C.wav")
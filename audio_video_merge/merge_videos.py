@@ -1,50 +1,95 @@
-from moviepy.editor import VideoFileClip, concatenate_audioclips, AudioFileClip
-from pychorus import find_and_output_chorus
 from pydub import AudioSegment
 import os
 import uuid
+from utilities.audiotools.audiotools import AudioTools
+from utilities.ffmpegtools.ffmpegtools import FFmpegTools
+from utilities.instrumentation.instrumentation import pipeline_metrics
+
+DEFAULT_OUTPUT_DIR = "/Users/mac/Desktop/Loss_function/audio_video_merge_videos"
 
 def loop_audio_segment(audio_path, loop_duration):
-    audio = AudioSegment.from_mp3(audio_path)
-    audio_length_ms = len(audio)
+    audio = AudioSegment.from_file(audio_path)
+    return AudioTools.tile_to_duration(audio, loop_duration)
 
-    if audio_length_ms >= loop_duration * 1000:
-        return audio[:loop_duration * 1000]
+def build_soundtrack(audio_paths, total_duration, crossfade=0):
+    # every join with a crossfade overlaps the two segments, so each segment is
+    # lengthened to keep the soundtrack exactly as long as the video
+    crossfade_seconds = crossfade / 1000.0
+    each_audio_duration = (total_duration + crossfade_seconds * (len(audio_paths) - 1)) / len(audio_paths)
+    crossfade = int(min(crossfade, each_audio_duration * 1000))
 
-    repeat_times = int(loop_duration * 1000 // audio_length_ms)
-    remaining_time = loop_duration * 1000 % audio_length_ms
+    combined_audio = None
+    for audio_path in audio_paths:
+        looped_audio = loop_audio_segment(audio_path, each_audio_duration)
+        if combined_audio is None:
+            combined_audio = looped_audio
+        else:
+            combined_audio = combined_audio.append(looped_audio, crossfade=crossfade)
+    return combined_audio
 
-    looped_audio = audio * repeat_times + audio[:remaining_time]
-    return looped_audio
+def add_audio_to_video(video_path, audio_paths, temp_dir=DEFAULT_OUTPUT_DIR, new_video_dir=DEFAULT_OUTPUT_DIR,
+                       crossfade=0, stream_copy=False):
+    """
+    Replace the soundtrack of a video with the given audio files played one after the other.
 
-def add_audio_to_video(video_path, audio_paths):
-    temp_dir = "/Users/mac/Desktop/Loss_function/audio_video_merge_videos"
-    new_video_dir = "/Users/mac/Desktop/Loss_function/audio_video_merge_videos"
-    video = VideoFileClip(video_path)
+    Args:
+        video_path (str): Path of the video.
+        audio_paths (list): Audio files, each looped or trimmed to an equal share of the video.
+        temp_dir (str): Directory for the intermediate WAV file of the re-encode mode.
+        new_video_dir (str): Directory of the new video.
+        crossfade (int): Crossfade between consecutive audio files in milliseconds.
+        stream_copy (bool): Copy the video stream and pipe the soundtrack to ffmpeg from memory
+            instead of re-encoding the video through moviepy.
 
-    if not os.path.exists(temp_dir):
-        os.makedirs(temp_dir)
+    Returns:
+        str: Path of the new video.
+    """
+    if isinstance(audio_paths, str):
+        audio_paths = [audio_paths]
+    if not audio_paths:
+        raise ValueError("At least one audio file is required.")
     if not os.path.exists(new_video_dir):
         os.makedirs(new_video_dir)
+    filename = str(uuid.uuid4()) + ".mp4"
+    new_video_path = os.path.join(new_video_dir, filename)
+    bytes_read = sum(os.path.getsize(path) for path in audio_paths)
+
+    if stream_copy:
+        ffmpeg = FFmpegTools()
+        total_duration = ffmpeg.probe(video_path)["duration"]
+        with pipeline_metrics.stage("audio_loop", job=video_path, bytes_read=bytes_read):
+            combined_audio = build_soundtrack(audio_paths, total_duration, crossfade)
+        with pipeline_metrics.stage("audio_mux", job=video_path, input_path=video_path,
+                                    output_path=new_video_path):
+            ffmpeg.mux_audio_pcm(video_path, combined_audio.raw_data, combined_audio.frame_rate,
+                                 combined_audio.channels, combined_audio.sample_width, new_video_path)
+        return new_video_path
+
+    # moviepy takes seconds to import, so only the re-encode mode loads it
+    from moviepy.video.io.VideoFileClip import VideoFileClip
+    from moviepy.audio.io.AudioFileClip import AudioFileClip
+
+    video = VideoFileClip(video_path)
+    if not os.path.exists(temp_dir):
+        os.makedirs(temp_dir)
     total_duration = video.duration
-    each_audio_duration = total_duration / len(audio_paths)
 
-    looped_audios = []
-    for audio_path in audio_paths:
-        looped_audio = loop_audio_segment(audio_path, each_audio_duration)
-        looped_audios.append(looped_audio)
-    combined_audio = sum(looped_audios, AudioSegment.silent(duration=0))
     combined_audio_path = os.path.join(temp_dir, "combined_audio.wav")
-    combined_audio.export(combined_audio_path, format='wav')
+    with pipeline_metrics.stage("audio_loop", job=video_path, output_path=combined_audio_path,
+                                bytes_read=bytes_read):
+        combined_audio = build_soundtrack(audio_paths, total_duration, crossfade)
+        combined_audio.export(combined_audio_path, format='wav')
     new_audio = AudioFileClip(combined_audio_path)
     video_with_audio = video.set_audio(new_audio)
-    filename = str(uuid.uuid4()) + ".mp4"
-    new_video_path = os.path.join(new_video_dir, filename)
-    video_with_audio.write_videofile(new_video_path)
+    with pipeline_metrics.stage("audio_mux", job=video_path, input_path=video_path,
+                                output_path=new_video_path) as record:
+        video_with_audio.write_videofile(new_video_path)
+        record["frames"] = int(total_duration * video.fps)
     if os.path.exists(combined_audio_path):
         os.remove(combined_audio_path)
     return new_video_path
 
-video_file = "final_output.mp4"
-audio_files = ["audios/JPM.wav"]
-new_video = add_audio_to_video(video_file, audio_files)
+if __name__ == "__main__":
+    video_file = "final_output.mp4"
+    audio_files = ["audios/JPM.wav"]
+    new_video = add_audio_to_video(video_file, audio_files)
@@ -0,0 +1,211 @@
+import base64
+import hashlib
+import io
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from benchmarks.syntheticsheets import sheet_png_bytes
+
+
+class FakeModelServer:
+    """
+    Local stand-in for the OpenAI images endpoint and the Gemini grid question.
+
+    ``POST /v1/images/generations`` answers with a synthetic sprite sheet (as a URL served by
+    ``GET /sheets/<key>.png`` or inline as b64_json). The grid and size of the sheet are read
+    from the prompt, e.g. "synthetic 4x6 sheet 2048px". ``POST /gemini`` answers "<rows> <cols>"
+    for a sheet it served before, and so does the Gemini REST endpoint
+    ``POST /v1beta/models/<model>:(stream)generateContent`` used by google.generativeai with
+    ``transport="rest"``. Each endpoint sleeps for its configured latency first, and
+    rate_limit makes the next requests of an endpoint fail with 429 and a Retry-After header.
+
+    Attributes:
+        image_latency (float): Seconds before answering an image generation.
+        download_latency (float): Seconds before serving a sheet download.
+        gemini_latency (float): Seconds before answering a grid question.
+        url (str): Base URL of the running server.
+    """
+
+    PROMPT_PATTERN = re.compile(r"(\d+)x(\d+)\D+(\d+)px")
+
+    def __init__(self, image_latency: float = 0.0, download_latency: float = 0.0, gemini_latency: float = 0.0):
+        self.image_latency = image_latency
+        self.download_latency = download_latency
+        self.gemini_latency = gemini_latency
+        self.requests = {"images": 0, "downloads": 0, "gemini": 0}
+        self._rate_limits = {}
+        self._sheets = {}
+        self._grids = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def rate_limit(self, endpoint: str, count: int = 1, retry_after: float = 1.0):
+
+        """
+        Answer the next requests of an endpoint with 429 Too Many Requests.
+
+        Args:
+            endpoint (str): "images" or "gemini".
+            count (int): Number of requests to reject.
+            retry_after (float): Seconds sent in the Retry-After header.
+        """
+
+        with self._lock:
+            self._rate_limits[endpoint] = (count, retry_after)
+
+    def _take_rate_limit(self, endpoint: str):
+        with self._lock:
+            count, retry_after = self._rate_limits.get(endpoint, (0, 0))
+            if count == 0:
+                return None
+            self._rate_limits[endpoint] = (count - 1, retry_after)
+            return retry_after
+
+    def sheet_for_prompt(self, prompt: str) -> tuple:
+
+        """
+        Render (once) and return the sheet a prompt asks for.
+
+        Args:
+            prompt (str): Prompt containing "<rows>x<cols> ... <size>px".
+
+        Returns:
+            tuple: Sheet key and PNG bytes.
+        """
+
+        match = self.PROMPT_PATTERN.search(prompt)
+        rows, cols, size = (int(value) for value in match.groups()) if match else (4, 4, 1024)
+        key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+        with self._lock:
+            if key not in self._sheets:
+                content = sheet_png_bytes(rows, cols, size, seed=int(key[:8], 16))
+                self._sheets[key] = content
+                self._grids[hashlib.sha256(content).hexdigest()] = (rows, cols)
+            return key, self._sheets[key]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def _rate_limited(self, endpoint: str) -> bool:
+                retry_after = server._take_rate_limit(endpoint)
+                if retry_after is None:
+                    return False
+                self._read_body()
+                body = json.dumps({"error": {"code": 429, "message": "Rate limit reached",
+                                             "status": "RESOURCE_EXHAUSTED"}}).encode()
+                self.send_response(429)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Retry-After", f"{retry_after:g}")
+                self.end_headers()
+                self.wfile.write(body)
+                return True
+
+            def do_POST(self):
+                if self.path.endswith("/images/generations"):
+                    server.requests["images"] += 1
+                    if self._rate_limited("images"):
+                        return
+                    time.sleep(server.image_latency)
+                    payload = json.loads(self._read_body())
+                    key, content = server.sheet_for_prompt(payload["prompt"])
+                    if payload.get("response_format") == "b64_json":
+                        image = {"b64_json": base64.b64encode(content).decode()}
+                    else:
+                        image = {"url": f"{server.url}/sheets/{key}.png"}
+                    body = json.dumps({"created": int(time.time()), "data": [image]}).encode()
+                    self._send(200, body, "application/json")
+                elif self.path == "/gemini":
+                    server.requests["gemini"] += 1
+                    time.sleep(server.gemini_latency)
+                    rows, cols = server._grids.get(hashlib.sha256(self._read_body()).hexdigest(), (0, 0))
+                    self._send(200, json.dumps({"text": f"{rows} {cols}"}).encode(), "application/json")
+                elif re.match(r"/v1beta/models/[\w.-]+:(stream)?generateContent\b", self.path, re.IGNORECASE):
+                    server.requests["gemini"] += 1
+                    if self._rate_limited("gemini"):
+                        return
+                    time.sleep(server.gemini_latency)
+                    parts = json.loads(self._read_body())["contents"][0]["parts"]
+                    image = next(base64.b64decode(part["inlineData"]["data"]) for part in parts if "inlineData" in part)
+                    rows, cols = server._grids.get(hashlib.sha256(image).hexdigest(), (0, 0))
+                    response = {"candidates": [{"content": {"parts": [{"text": f"{rows} {cols}"}], "role": "model"},
+                                                "finishReason": 1, "index": 0}]}
+                    # the REST transport reads a stream as one JSON array of responses
+                    if ":streamGenerateContent" in self.path:
+                        response = [response]
+                    self._send(200, json.dumps(response).encode(), "application/json")
+                else:
+                    self._send(404, b"{}", "application/json")
+
+            def do_GET(self):
+                match = re.fullmatch(r"/sheets/(\w+)\.png", self.path)
+                content = server._sheets.get(match.group(1)) if match else None
+                if content is None:
+                    self._send(404, b"", "text/plain")
+                    return
+                server.requests["downloads"] += 1
+                time.sleep(server.download_latency)
+                self._send(200, content, "image/png")
+
+        return Handler
+
+
+class FakeGeminiModel:
+    """
+    Drop-in for genai.GenerativeModel that asks a FakeModelServer instead of Gemini.
+    """
+
+    class Response:
+        def __init__(self, text: str):
+            self.text = text
+
+        def resolve(self):
+            pass
+
+    def __init__(self, server_url: str):
+        self.server_url = server_url
+        self.session = requests.Session()
+
+    def generate_content(self, contents: list, stream: bool = False, request_options: dict = None):
+        image = contents[1]
+        # the server recognises a sheet by the hash of the file it served, so send that file as is
+        if getattr(image, "filename", ""):
+            with open(image.filename, "rb") as f:
+                content = f.read()
+        else:
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG")
+            content = buffer.getvalue()
+        response = self.session.post(f"{self.server_url}/gemini", data=content, timeout=30)
+        response.raise_for_status()
+        return self.Response(response.json()["text"])
@@ -0,0 +1,270 @@
+"""
+Offline end-to-end benchmarks for the generation pipeline.
+
+Every scenario runs in a fresh interpreter (so peak RSS is per scenario) inside a scratch
+directory, against a FakeModelServer standing in for OpenAI and Gemini. Results are compared
+with a baseline file and regressions beyond the tolerance are reported with a non-zero exit.
+
+    python -m benchmarks.run_benchmarks                      # run and compare with the baseline
+    python -m benchmarks.run_benchmarks --update-baseline    # run and store the results as the baseline
+
+benchmarks/baseline.json holds the medians of three runs (--repeat 3) on a single core machine.
+Timings depend on the machine, so before comparing on another one, bootstrap a baseline there:
+check out the reference commit, run with --update-baseline --repeat 3 (pass --baseline to keep
+one file per machine), then compare your change with --repeat 3.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, "benchmarks", "baseline.json")
+GEMINI_PROMPT = "Please tell me how many rows and columns in this sprite sheet, answer me like that [rows] [columns]."
+
+# metric name suffixes where a larger value is an improvement
+HIGHER_IS_BETTER = ("_per_min",)
+
+SHEETS = [(4, 4, 1024), (3, 3, 1024), (4, 6, 2048), (8, 8, 4096)]
+SCENARIOS = (
+    [f"sprite_{rows}x{cols}_{size}" for rows, cols, size in SHEETS]
+    + [f"sprite_stream_{rows}x{cols}_{size}" for rows, cols, size in SHEETS]
+    + ["batch_throughput", "merge", "audio_merge", "audio_mux_copy"]
+)
+
+
+def _generator(server, **options):
+    from VideoGeneration.videoGeneration import SpriteVideoGeneration
+    from benchmarks.fakeservers import FakeGeminiModel
+
+    generator = SpriteVideoGeneration(api_key="benchmark", organization="", gemini_api_key="benchmark",
+                                      max_tries=1, **options)
+    generator.model = FakeGeminiModel(server.url)
+    return generator
+
+
+def _stage_seconds(records) -> dict:
+    seconds = {}
+    for record in records:
+        key = f"{record['stage']}_seconds"
+        seconds[key] = seconds.get(key, 0.0) + record["wall_seconds"]
+    return seconds
+
+
+def _prompt(rows, cols, size, index=0) -> str:
+    return f"synthetic {rows}x{cols} sheet {size}px take {index}"
+
+
+def _sprite_videos(server, count: int, stream: bool) -> list:
+    from VideoGeneration.batchGeneration import BatchSpriteVideoGeneration
+    from benchmarks.fakeservers import FakeGeminiModel
+
+    batch = BatchSpriteVideoGeneration(api_key="benchmark", organization="", gemini_api_key="benchmark",
+                                       stream_copy_loop=stream)
+    batch.generator.model = FakeGeminiModel(server.url)
+    jobs = [{"video_prompt": _prompt(4, 4, 1024, index), "duration": 100} for index in range(count)]
+    return batch.generate_videos(jobs, "generated_sprites", GEMINI_PROMPT, stream_encode=stream)
+
+
+def _write_tone(path: str, seconds: float, sample_rate: int = 44100):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    samples = (np.sin(2 * np.pi * 440 * t) * 0.3 * 32767).astype(np.int16)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.tobytes())
+
+
+def run_scenario(name: str) -> dict:
+    """
+    Run one scenario in the current process and working directory.
+
+    Args:
+        name (str): Scenario name from SCENARIOS.
+
+    Returns:
+        dict: Metric name to value.
+    """
+    from benchmarks.fakeservers import FakeModelServer
+    from utilities.instrumentation.instrumentation import pipeline_metrics
+
+    server = FakeModelServer(image_latency=0.5, download_latency=0.05, gemini_latency=0.5).start()
+    os.environ["OPENAI_BASE_URL"] = f"{server.url}/v1"
+    results = {}
+    start = time.perf_counter()
+    try:
+        if name.startswith("sprite_"):
+            stream = name.startswith("sprite_stream_")
+            rows, cols, size = (int(value) for value in name.rsplit("_", 2)[1].split("x") + [name.rsplit("_", 1)[1]])
+            generator = _generator(server, stream_copy_loop=stream)
+            video_path = generator.generate_sprite_and_animation(
+                _prompt(rows, cols, size), "generated_sprites", GEMINI_PROMPT, animation_duration=100,
+                stream_encode=stream)
+            results["output_bytes"] = os.path.getsize(video_path)
+        elif name == "batch_throughput":
+            videos = _sprite_videos(server, count=8, stream=True)
+            results["videos_per_min"] = len(videos) / (time.perf_counter() - start) * 60
+        elif name == "merge":
+            videos = _sprite_videos(server, count=4, stream=True)
+            start = time.perf_counter()
+            pipeline_metrics.drain()
+            generator = _generator(server)
+            generator.merge_and_resize_videos(videos, "merged.mp4", 480, 480)
+            results["output_bytes"] = os.path.getsize("merged.mp4")
+        elif name == "audio_merge":
+            from audio_video_merge.merge_audio_video import add_audio_to_video
+
+            videos = _sprite_videos(server, count=1, stream=True)
+            _write_tone("tone.wav", seconds=7.0)
+            start = time.perf_counter()
+            pipeline_metrics.drain()
+            output_path = add_audio_to_video(videos[0], "tone.wav", temp_dir=os.path.abspath("audio_temp"),
+                                             new_video_dir=os.path.abspath("audio_out"))
+            results["output_bytes"] = os.path.getsize(output_path)
+        elif name == "audio_mux_copy":
+            from audio_video_merge.merge_videos import add_audio_to_video
+
+            videos = _sprite_videos(server, count=1, stream=True)
+            _write_tone("tone.wav", seconds=7.0)
+            start = time.perf_counter()
+            pipeline_metrics.drain()
+            output_path = add_audio_to_video(videos[0], ["tone.wav", "tone.wav"], crossfade=500, stream_copy=True,
+                                             new_video_dir=os.path.abspath("audio_out"))
+            results["output_bytes"] = os.path.getsize(output_path)
+        else:
+            raise ValueError(f"Unknown scenario {name}")
+    finally:
+        server.stop()
+
+    results["total_seconds"] = time.perf_counter() - start
+    results.update(_stage_seconds(pipeline_metrics.drain()))
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        results["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+        results["peak_child_rss_mb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 1e6
+    return results
+
+
+def run_isolated(name: str) -> dict:
+    """
+    Run a scenario in a fresh interpreter inside a scratch directory.
+
+    Returns:
+        dict: Metric name to value, or {"error": message} if the scenario failed.
+    """
+    with tempfile.TemporaryDirectory() as scratch:
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])))
+        process = subprocess.run([sys.executable, "-m", "benchmarks.run_benchmarks", "--scenario", name],
+                                 cwd=scratch, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        lines = process.stdout.decode(errors="replace").strip().splitlines()
+        if process.returncode != 0 or not lines:
+            return {"error": process.stderr.decode(errors="replace").strip().splitlines()[-1:]}
+        return json.loads(lines[-1])
+
+
+def run_repeated(name: str, repeat: int) -> dict:
+    """
+    Run a scenario several times and keep the median of every metric, to damp scheduling noise.
+
+    Returns:
+        dict: Metric name to median value, or the first {"error": message} if a run failed.
+    """
+    runs = [run_isolated(name) for _ in range(repeat)]
+    failed = next((run for run in runs if "error" in run), None)
+    if failed is not None:
+        return failed
+    results = {}
+    for key in runs[0]:
+        values = [run[key] for run in runs if key in run]
+        median = float(np.median(values))
+        results[key] = int(median) if all(isinstance(value, int) for value in values) else median
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_seconds: float = 0.0) -> list:
+    """
+    Find metrics that got worse than the baseline by more than the tolerance.
+
+    Args:
+        results (dict): Scenario name to metrics of this run.
+        baseline (dict): Scenario name to metrics of the baseline.
+        tolerance (float): Allowed relative change, e.g. 0.2 for 20%.
+        min_seconds (float): Timing changes smaller than this many seconds are noise, whatever their ratio.
+
+    Returns:
+        list: Human readable regression messages.
+    """
+    regressions = []
+    for scenario, metrics in results.items():
+        for metric, value in metrics.items():
+            previous = baseline.get(scenario, {}).get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(previous, (int, float)) or previous <= 0:
+                continue
+            if metric.endswith("_seconds") and abs(value - previous) < min_seconds:
+                continue
+            change = (value - previous) / previous
+            if metric.endswith(HIGHER_IS_BETTER):
+                change = -change
+            if change > tolerance:
+                regressions.append(f"{scenario}.{metric}: {previous:.3f} -> {value:.3f} ({change:+.0%} worse)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", help="run a single scenario in this process and print its metrics as JSON")
+    parser.add_argument("--only", nargs="*", default=None, help="scenarios to run (default: all)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file to compare with")
+    parser.add_argument("--update-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression (default 0.25)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per scenario, the median is kept (default 1)")
+    parser.add_argument("--min-seconds", type=float, default=0.1,
+                        help="ignore timing changes smaller than this many seconds (default 0.1)")
+    args = parser.parse_args()
+
+    if args.scenario:
+        results = run_scenario(args.scenario)
+        print(json.dumps(results))
+        return
+
+    results = {}
+    for name in args.only or SCENARIOS:
+        results[name] = run_repeated(name, args.repeat)
+        summary = ", ".join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+                            for key, value in results[name].items())
+        print(f"{name}: {summary}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"Baseline missing: {args.baseline} does not exist, so nothing was compared. Run with "
+              f"--update-baseline on a reference commit to create it.", file=sys.stderr)
+        sys.exit(2)
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance, args.min_seconds)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+    print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
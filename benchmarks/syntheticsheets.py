@@ -0,0 +1,49 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+
+def make_sheet(rows: int, cols: int, size: int, seed: int = 0) -> Image.Image:
+    """
+    Draw a synthetic sprite sheet: a ball bouncing across rows x cols cells on a light background.
+
+    Args:
+        rows (int): Number of rows in the sheet.
+        cols (int): Number of columns in the sheet.
+        size (int): Width and height of the sheet in pixels.
+        seed (int): Seed for the ball colour and background noise.
+
+    Returns:
+        Image.Image: RGB sprite sheet.
+    """
+    rng = np.random.default_rng(seed)
+    cell_height, cell_width = size // rows, size // cols
+    y, x = np.mgrid[0:cell_height, 0:cell_width]
+    radius = min(cell_width, cell_height) * 0.28
+    color = rng.integers(0, 160, size=3)
+
+    sheet = np.full((size, size, 3), 245, dtype=np.uint8)
+    sheet += rng.integers(0, 6, size=sheet.shape, dtype=np.uint8)
+    frames = rows * cols
+    for index in range(frames):
+        row, col = divmod(index, cols)
+        phase = abs(np.sin(np.pi * index / frames))
+        center_y = cell_height * (0.3 + 0.4 * phase)
+        center_x = cell_width * 0.5
+        ball = (y - center_y) ** 2 + (x - center_x) ** 2 <= radius ** 2
+        cell = sheet[row * cell_height:(row + 1) * cell_height, col * cell_width:(col + 1) * cell_width]
+        cell[ball] = color
+    return Image.fromarray(sheet)
+
+
+def sheet_png_bytes(rows: int, cols: int, size: int, seed: int = 0) -> bytes:
+    """
+    Encode a synthetic sprite sheet as PNG.
+
+    Returns:
+        bytes: PNG file content.
+    """
+    buffer = io.BytesIO()
+    make_sheet(rows, cols, size, seed).save(buffer, format="PNG")
+    return buffer.getvalue()
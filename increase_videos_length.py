@@ -1,6 +1,21 @@
+import os
+
 from moviepy.editor import VideoFileClip, ImageClip, concatenate_videoclips
+from utilities.ffmpegtools.ffmpegtools import FFmpegTools
+
+def loop_gif_to_mp4(input_gif, output_mp4, target_duration=20, stream_copy=False):
+    if stream_copy:
+        # Encode a single cycle and repeat it in the container instead of re-encoding every loop
+        ffmpeg = FFmpegTools()
+        cycle_path = f"{output_mp4}.cycle.mp4"
+        try:
+            _, cycle_duration = ffmpeg.encode_gif_cycle(input_gif, cycle_path)
+            ffmpeg.loop_by_stream_copy(cycle_path, output_mp4, cycle_duration, target_duration)
+        finally:
+            if os.path.exists(cycle_path):
+                os.remove(cycle_path)
+        return
 
-def loop_gif_to_mp4(input_gif, output_mp4, target_duration=20):
     # Read the original GIF
     original_clip = VideoFileClip(input_gif)
 
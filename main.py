@@ -1,10 +1,11 @@
-from VideoGeneration.videoGeneration import SpriteVideoGeneration
+from VideoGeneration.batchGeneration import BatchSpriteVideoGeneration
+from VideoGeneration.jobGraph import SpriteVideoPipeline
+from utilities.instrumentation.instrumentation import pipeline_metrics
 from dotenv import load_dotenv
 import os
 
 
 def main():
-    global sprite_video_generator
     load_dotenv()
     api_key = os.getenv("OPENAI_API_KEY", "")
     organization = os.getenv("ORGANIZATION_KEY", "")
@@ -22,27 +23,31 @@ def main():
             "duration": 200,
         }
     ]
-    videos_path = []
-    for item in video_json:
-        sprite_video_generator = SpriteVideoGeneration(
-            api_key=api_key, organization=organization,
-            gemini_api_key=gemini_api_key,
-            default_size="1024x1024",
-            default_quality="standard",
-            max_tries=3
-        )
-        sprite_video_generator.generate_sprite_and_animation(
-            prompt=item.get('video_prompt'),
+    batch_generator = BatchSpriteVideoGeneration(
+        api_key=api_key, organization=organization,
+        gemini_api_key=gemini_api_key,
+        default_size="1024x1024",
+        default_quality="standard",
+        max_tries=3
+    )
+    os.makedirs("generated_sprites", exist_ok=True)
+    # finished stages are recorded in the manifest, so a rerun resumes after a failure
+    pipeline = SpriteVideoPipeline(batch_generator, manifest_path="generated_sprites/manifest.sqlite")
+    try:
+        pipeline.run(
+            video_json=video_json,
             save_directory="generated_sprites",
             gemini_prompt="Please tell me how many rows and columns in this sprite sheet, tell me only rows and "
                           "columns no extra stuff please, answer me like that [rows] [columns].",
-            animation_duration=item.get('duration'),
+            output_path="generated_sprites/final_output.mp4",
+            target_width=480,
+            target_height=480,
             animation_loop=0
         )
-        videos_path.append(f"generated_sprites/{item.get('video_prompt')}/Extended_{item.get('video_prompt')}.mp4")
-    sprite_video_generator.merge_and_resize_videos(video_paths=videos_path,
-                                                   output_path="generated_sprites/final_output.mp4", target_width=480,
-                                                   target_height=480)
+    finally:
+        pipeline_metrics.write_jsonl("generated_sprites/metrics.jsonl")
+        pipeline_metrics.write_prometheus("generated_sprites/metrics.prom")
+        print(pipeline_metrics.summary_table())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,22 @@
+import pytest
+from pydub import AudioSegment
+from pydub.generators import Sine
+
+from utilities.audiotools.audiotools import AudioTools
+
+
+@pytest.mark.parametrize("duration", [0.1, 0.7, 2.7183, 10])
+def test_tile_to_duration_is_exact_and_loops_the_samples(duration):
+    audio = Sine(440).to_audio_segment(duration=700).set_channels(2)
+    frame_count = int(round(duration * audio.frame_rate))
+
+    tiled = AudioTools.tile_to_duration(audio, duration)
+
+    assert int(tiled.frame_count()) == frame_count
+    assert (tiled.frame_rate, tiled.channels, tiled.sample_width) == (audio.frame_rate, 2, audio.sample_width)
+    assert tiled.raw_data == (audio * 15).get_sample_slice(0, frame_count).raw_data
+
+
+def test_tile_to_duration_rejects_empty_audio():
+    with pytest.raises(ValueError):
+        AudioTools.tile_to_duration(AudioSegment.empty(), 1)
@@ -0,0 +1,31 @@
+import threading
+
+import pychorus
+
+from utilities.choruscache.choruscache import ChorusCache
+
+
+def test_instances_sharing_a_file_keep_each_others_offsets(tmp_path, monkeypatch):
+    monkeypatch.setattr(pychorus, "find_and_output_chorus", lambda path, output, clip_length: 12.5)
+    cache_path = str(tmp_path / "chorus.json")
+    tracks = []
+    for name in ("a", "b", "c", "d"):
+        path = tmp_path / f"{name}.mp3"
+        path.write_bytes(name.encode() * 100)
+        tracks.append(str(path))
+    # both load the empty file before either saves
+    caches = [ChorusCache(cache_path), ChorusCache(cache_path)]
+    for cache in caches:
+        cache._load()
+
+    threads = [threading.Thread(target=caches[index % 2].chorus_start, args=(track,))
+               for index, track in enumerate(tracks)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    reloaded = ChorusCache(cache_path)
+    assert all(reloaded.chorus_start(track) == 12.5 for track in tracks)
+    assert (reloaded.hits, reloaded.misses) == (4, 0)
+    assert not [path for path in tmp_path.iterdir() if path.suffix == ".tmp"]
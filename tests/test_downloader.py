@@ -0,0 +1,98 @@
+import base64
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utilities.downloader.downloader import AssetDownloader
+
+CONTENT = bytes(range(256)) * 64
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/missing":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = CONTENT
+        self.send_response(200)
+        if self.path == "/truncated":
+            # announce more bytes than are sent, as a dropped connection would
+            self.send_header("Content-Length", str(len(body) + 100))
+        else:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_with_matching_checksum(tmp_path, server_url):
+    destination = tmp_path / "nested" / "sheet.png"
+
+    result = AssetDownloader().download(f"{server_url}/sheet.png", str(destination),
+                                        sha256=hashlib.sha256(CONTENT).hexdigest().upper())
+
+    assert result == str(destination)
+    assert destination.read_bytes() == CONTENT
+    assert list(destination.parent.iterdir()) == [destination]
+
+
+def test_checksum_mismatch_leaves_no_file(tmp_path, server_url):
+    destination = tmp_path / "sheet.png"
+
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        AssetDownloader().download(f"{server_url}/sheet.png", str(destination), sha256="0" * 64)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_checksum_mismatch_keeps_previous_file(tmp_path, server_url):
+    destination = tmp_path / "sheet.png"
+    destination.write_bytes(b"previous")
+
+    with pytest.raises(ValueError):
+        AssetDownloader().download(f"{server_url}/sheet.png", str(destination), sha256="0" * 64)
+
+    assert destination.read_bytes() == b"previous"
+    assert list(tmp_path.iterdir()) == [destination]
+
+
+def test_truncated_download_leaves_no_file(tmp_path, server_url):
+    destination = tmp_path / "sheet.png"
+
+    # requests reports the short body as a ChunkedEncodingError, an IOError
+    with pytest.raises(IOError):
+        AssetDownloader(timeout=(2, 2)).download(f"{server_url}/truncated", str(destination))
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_error_status_raises_value_error(tmp_path, server_url):
+    with pytest.raises(ValueError, match="Status code: 404"):
+        AssetDownloader().download(f"{server_url}/missing", str(tmp_path / "sheet.png"))
+
+
+def test_save_base64_checks_the_decoded_content(tmp_path):
+    destination = tmp_path / "sheet.png"
+    data = base64.b64encode(CONTENT).decode("ascii")
+
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        AssetDownloader().save_base64(data, str(destination), sha256="0" * 64)
+    assert list(tmp_path.iterdir()) == []
+
+    AssetDownloader().save_base64(data, str(destination), sha256=hashlib.sha256(CONTENT).hexdigest())
+    assert destination.read_bytes() == CONTENT
@@ -0,0 +1,27 @@
+import multiprocessing
+
+from audio_video_merge.extract_audio import extract_audio_batch
+from utilities.ffmpegtools.ffmpegtools import FFmpegTools
+from utilities.instrumentation.instrumentation import pipeline_metrics
+
+
+def _video_with_audio(path):
+    FFmpegTools().run(["-f", "lavfi", "-i", "color=c=red:s=64x64:d=1", "-f", "lavfi", "-i", "sine=f=440:d=1",
+                       "-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest", str(path)])
+
+
+def test_batch_runs_under_spawn(tmp_path):
+    videos = tmp_path / "videos"
+    videos.mkdir()
+    for name in ("a", "b"):
+        _video_with_audio(videos / f"{name}.mp4")
+    pipeline_metrics.drain()
+
+    outputs = extract_audio_batch(str(videos), str(tmp_path / "audio"), extension=".m4a", workers=2,
+                                  mp_context=multiprocessing.get_context("spawn"))
+
+    assert sorted(outputs) == [str(videos / "a.mp4"), str(videos / "b.mp4")]
+    for audio_path in outputs.values():
+        assert FFmpegTools().probe(audio_path)["audio_codec"] == "aac"
+    # the stage records of the spawned workers come back to this process
+    assert [record["mode"] for record in pipeline_metrics.drain()] == ["copy", "copy"]
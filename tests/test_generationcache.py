@@ -0,0 +1,90 @@
+import threading
+import time
+
+from utilities.generationcache.generationcache import GenerationCache
+
+
+def _sheet(tmp_path, name: str, size: int = 100):
+    path = tmp_path / name
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def test_instances_sharing_a_directory_keep_each_others_entries(tmp_path):
+    directory = str(tmp_path / "cache")
+    first, second = GenerationCache(directory), GenerationCache(directory)
+
+    first.put("a", _sheet(tmp_path, "a.png"))
+    second.put("b", _sheet(tmp_path, "b.png"))
+
+    assert set(GenerationCache(directory)._index) == {"a", "b"}
+
+
+def test_evicted_entries_are_not_brought_back(tmp_path):
+    directory = str(tmp_path / "cache")
+    first = GenerationCache(directory, max_bytes=150)
+    first.put("a", _sheet(tmp_path, "a.png"))
+    second = GenerationCache(directory, max_bytes=150)
+
+    # evicts "a" to stay under max_bytes
+    first.put("b", _sheet(tmp_path, "b.png"))
+    second.put("c", _sheet(tmp_path, "c.png", size=10))
+
+    index = GenerationCache(directory)._index
+    assert "a" not in index
+    assert {"b", "c"} <= set(index)
+
+
+def test_concurrent_writers_do_not_race_on_the_index(tmp_path):
+    directory = str(tmp_path / "cache")
+    source = _sheet(tmp_path, "sheet.png")
+    errors = []
+
+    def write(worker: int):
+        cache = GenerationCache(directory)
+        try:
+            for index in range(30):
+                cache.put(f"{worker}-{index}", source)
+                cache.get(f"{worker}-{index}", str(tmp_path / f"out-{worker}.png"))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(GenerationCache(directory)._index) == 6 * 30
+    assert not [path for path in (tmp_path / "cache").iterdir() if path.suffix == ".tmp"]
+
+
+def test_hits_do_not_rewrite_the_index(tmp_path):
+    directory = tmp_path / "cache"
+    cache = GenerationCache(str(directory))
+    cache.put("a", _sheet(tmp_path, "a.png"))
+    index = (directory / "index.json").read_bytes()
+    index_mtime = (directory / "index.json").stat().st_mtime_ns
+
+    for _ in range(5):
+        assert cache.get("a", str(tmp_path / "out.png")) == str(tmp_path / "out.png")
+
+    assert (directory / "index.json").read_bytes() == index
+    assert (directory / "index.json").stat().st_mtime_ns == index_mtime
+    assert cache.stats()["hits"] == 5
+
+
+def test_hits_from_another_instance_count_for_eviction(tmp_path):
+    directory = str(tmp_path / "cache")
+    writer = GenerationCache(directory, max_bytes=250)
+    writer.put("a", _sheet(tmp_path, "a.png"))
+    time.sleep(0.01)
+    writer.put("b", _sheet(tmp_path, "b.png"))
+    time.sleep(0.01)
+
+    # "a" is used by another process, so "b" becomes the least recently used entry
+    assert GenerationCache(directory).get("a", str(tmp_path / "out.png"))
+    writer.put("c", _sheet(tmp_path, "c.png"))
+
+    assert set(GenerationCache(directory)._index) == {"a", "c"}
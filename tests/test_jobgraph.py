@@ -0,0 +1,63 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from VideoGeneration.jobGraph import JobGraph, Stage
+from utilities.manifest.manifest import ArtifactManifest
+
+
+def test_concurrent_graphs_run_a_shared_stage_once(tmp_path):
+    manifest = ArtifactManifest(str(tmp_path / "manifest.sqlite"))
+    inflight = {}
+    calls = []
+
+    def render():
+        calls.append(1)
+        time.sleep(0.2)
+        path = tmp_path / "Extended_cat.mp4"
+        path.write_bytes(b"video")
+        return str(path)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        graphs = []
+        for job in ("first", "second"):
+            graph = JobGraph(manifest, io_pool=pool, cpu_pool=pool, inflight=inflight)
+            graph.add(Stage("video:cat", "video", render, params=dict(prompt="cat"), outputs=lambda path: [path]))
+            graphs.append(graph)
+        results = {}
+        threads = [threading.Thread(target=lambda graph=graph: results.setdefault(id(graph), graph.run()))
+                   for graph in graphs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert len(calls) == 1
+    assert [results[id(graph)]["video:cat"] for graph in graphs] == [str(tmp_path / "Extended_cat.mp4")] * 2
+    assert sorted(len(graph.executed) for graph in graphs) == [0, 1]
+    assert inflight == {}
+
+
+def test_failure_of_a_shared_stage_reaches_every_graph(tmp_path):
+    manifest = ArtifactManifest(str(tmp_path / "manifest.sqlite"))
+    inflight = {}
+    release = threading.Event()
+
+    def render():
+        release.wait(5)
+        raise ValueError("encoder failed")
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        graphs = [JobGraph(manifest, io_pool=pool, cpu_pool=pool, inflight=inflight) for _ in range(2)]
+        for graph in graphs:
+            graph.add(Stage("video:cat", "video", render, params=dict(prompt="cat")))
+        threads = [threading.Thread(target=graph.run) for graph in graphs]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+    assert [graph.failed for graph in graphs] == [["video:cat"], ["video:cat"]]
+    assert inflight == {}
@@ -0,0 +1,226 @@
+import email.utils
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.fakeservers import FakeModelServer
+from utilities.requestscheduler.requestscheduler import RequestScheduler, TokenBucket
+
+
+class _Response:
+    def __init__(self, status_code: int, headers: dict = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class _APIError(Exception):
+    def __init__(self, status_code: int, headers: dict = None):
+        super().__init__(f"status {status_code}")
+        self.response = _Response(status_code, headers)
+
+
+def _failing_then(result, errors: list):
+    calls = []
+
+    def fn():
+        calls.append(time.monotonic())
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    return fn, calls
+
+
+def test_retry_after_seconds_delays_the_retry():
+    scheduler = RequestScheduler(max_tries=3, base_delay=0.0)
+    scheduler.configure("openai", rate=100.0, burst=10)
+    fn, calls = _failing_then("ok", [_APIError(429, {"Retry-After": "0.3"})])
+
+    assert scheduler.call("openai", fn) == "ok"
+
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.3
+
+
+def test_retry_after_pauses_the_whole_provider():
+    scheduler = RequestScheduler(max_tries=2, base_delay=0.0)
+    scheduler.configure("openai", rate=100.0, burst=10)
+    fn, _ = _failing_then("ok", [_APIError(429, {"retry-after": "0.3"})])
+    started = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        failing = pool.submit(scheduler.call, "openai", fn)
+        time.sleep(0.05)
+        # issued while the provider is paused, so it waits for the pause as well
+        scheduler.call("openai", lambda: None)
+        other_finished = time.monotonic() - started
+        assert failing.result() == "ok"
+
+    assert other_finished >= 0.3
+
+
+def test_retry_after_http_date_is_parsed():
+    retry_at = email.utils.formatdate(time.time() + 30, usegmt=True)
+
+    delay = RequestScheduler._retry_after(_APIError(429, {"Retry-After": retry_at}))
+
+    assert 25 <= delay <= 31
+    assert RequestScheduler._retry_after(_APIError(429, {"Retry-After": "soon"})) is None
+    assert RequestScheduler._retry_after(_APIError(429)) is None
+
+
+def test_non_retriable_status_is_raised_at_once():
+    scheduler = RequestScheduler(max_tries=5, base_delay=0.0)
+    fn, calls = _failing_then("ok", [_APIError(400)])
+
+    with pytest.raises(_APIError):
+        scheduler.call("openai", fn)
+    assert len(calls) == 1
+
+
+def test_gives_up_after_max_tries():
+    scheduler = RequestScheduler(max_tries=3, base_delay=0.0)
+    scheduler.configure("openai", rate=100.0, burst=10)
+    fn, calls = _failing_then("ok", [_APIError(500)] * 3)
+
+    with pytest.raises(_APIError):
+        scheduler.call("openai", fn)
+    assert len(calls) == 3
+
+
+def test_coalesced_keys_run_once():
+    scheduler = RequestScheduler()
+    scheduler.configure("gemini", rate=100.0, burst=10)
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return object()
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        futures = [pool.submit(scheduler.call, "gemini", fn, key=("grid", "sheet.png")) for _ in range(5)]
+        time.sleep(0.2)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert scheduler._inflight == {}
+
+
+def test_coalesced_callers_share_the_error():
+    scheduler = RequestScheduler(max_tries=1)
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        raise _APIError(400)
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(scheduler.call, "gemini", fn, key="same") for _ in range(3)]
+        time.sleep(0.2)
+        release.set()
+        for future in futures:
+            with pytest.raises(_APIError):
+                future.result()
+    assert len(calls) == 1
+
+
+def test_different_keys_are_not_coalesced():
+    scheduler = RequestScheduler()
+    scheduler.configure("gemini", rate=100.0, burst=10)
+    calls = []
+
+    for key in ("a", "b", "a"):
+        scheduler.call("gemini", lambda: calls.append(1), key=key)
+
+    assert len(calls) == 3
+
+
+def test_token_bucket_limits_the_rate_after_the_burst():
+    bucket = TokenBucket(rate=20.0, capacity=2)
+    started = time.monotonic()
+
+    for _ in range(6):
+        bucket.acquire()
+
+    # two tokens of burst, then four at 20 per second
+    assert time.monotonic() - started >= 0.18
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    server = FakeModelServer().start()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"{server.url}/v1")
+    yield server
+    server.stop()
+
+
+def _generator(server: FakeModelServer, max_tries: int):
+    import google.generativeai as genai
+    from VideoGeneration.videoGeneration import SpriteVideoGeneration
+
+    scheduler = RequestScheduler(max_tries=max_tries, base_delay=0.0)
+    # the local detector must not answer, every grid question goes to Gemini
+    generator = SpriteVideoGeneration("key", "", "key", scheduler=scheduler, grid_confidence_threshold=1.1)
+    genai.configure(api_key="key", transport="rest", client_options={"api_endpoint": server.url})
+    generator.model = genai.GenerativeModel("gemini-pro-vision")
+    return generator
+
+
+def test_openai_429_is_retried_once_by_the_scheduler(fake_api):
+    generator = _generator(fake_api, max_tries=3)
+    fake_api.rate_limit("images", count=1, retry_after=0.3)
+    started = time.monotonic()
+
+    image = generator.generate_image("synthetic 2x2 sheet 256px", "1024x1024", "standard", response_format="b64_json")
+
+    assert image.b64_json
+    assert time.monotonic() - started >= 0.3
+    assert fake_api.requests["images"] == 2
+
+
+def test_openai_sdk_does_not_retry_on_its_own(fake_api):
+    import openai
+
+    generator = _generator(fake_api, max_tries=2)
+    fake_api.rate_limit("images", count=10, retry_after=0.05)
+
+    with pytest.raises(openai.RateLimitError):
+        generator.generate_image("synthetic 2x2 sheet 256px", "1024x1024", "standard")
+    assert fake_api.requests["images"] == 2
+
+
+def test_gemini_429_is_retried_once_by_the_scheduler(fake_api, tmp_path, monkeypatch):
+    generator = _generator(fake_api, max_tries=3)
+    _, content = fake_api.sheet_for_prompt("synthetic 3x5 sheet 512px")
+    # relative, get_sprite_details sanitizes the dashes of the pytest temp path
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "sheet.png").write_bytes(content)
+    fake_api.rate_limit("gemini", count=1, retry_after=0.3)
+    started = time.monotonic()
+
+    assert generator.get_sprite_details("rows and columns?", "sheet.png") == (3, 5)
+    assert time.monotonic() - started >= 0.3
+    assert fake_api.requests["gemini"] == 2
+
+
+def test_gemini_sdk_does_not_retry_on_its_own(fake_api, tmp_path, monkeypatch):
+    from google.api_core.exceptions import TooManyRequests
+
+    generator = _generator(fake_api, max_tries=2)
+    _, content = fake_api.sheet_for_prompt("synthetic 3x5 sheet 512px")
+    # relative, get_sprite_details sanitizes the dashes of the pytest temp path
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "sheet.png").write_bytes(content)
+    fake_api.rate_limit("gemini", count=10, retry_after=0.05)
+
+    with pytest.raises(TooManyRequests):
+        generator.get_sprite_details("rows and columns?", "sheet.png")
+    assert fake_api.requests["gemini"] == 2
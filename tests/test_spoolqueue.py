@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+import time
+
+from VideoGeneration.worker import SpoolQueue
+
+
+def test_recover_leaves_claims_of_live_workers(tmp_path):
+    spool = str(tmp_path / "spool")
+    busy, restarted = SpoolQueue(spool), SpoolQueue(spool)
+    busy.submit({"prompt": "cat"})
+    name, _ = busy.claim()
+
+    assert restarted.recover() == 0
+    assert os.listdir(os.path.join(spool, "incoming")) == []
+
+    busy.finish(name, {"ok": True})
+    assert os.listdir(os.path.join(spool, "done")) == [name]
+    assert os.listdir(os.path.join(spool, "running")) == []
+
+
+def test_recover_requeues_claims_of_dead_workers(tmp_path):
+    spool = str(tmp_path / "spool")
+    queue = SpoolQueue(spool)
+    queue.submit({"prompt": "cat"})
+    dead = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+    crashed = SpoolQueue(spool)
+    crashed.owner = dict(crashed.owner, pid=int(dead.stdout))
+    crashed.claim()
+
+    assert queue.recover() == 1
+    assert len(os.listdir(os.path.join(spool, "incoming"))) == 1
+    assert os.listdir(os.path.join(spool, "running")) == []
+
+
+def test_recover_requeues_expired_leases(tmp_path):
+    spool = str(tmp_path / "spool")
+    other_host = SpoolQueue(spool)
+    other_host.owner = dict(other_host.owner, host="elsewhere")
+    other_host.submit({"prompt": "cat"})
+    other_host.claim()
+
+    assert SpoolQueue(spool, lease_seconds=30).recover() == 0
+    time.sleep(0.1)
+    assert SpoolQueue(spool, lease_seconds=0.05).recover() == 1
+
+
+def test_finish_tolerates_a_recovered_job(tmp_path):
+    spool = str(tmp_path / "spool")
+    queue = SpoolQueue(spool)
+    queue.submit({"prompt": "cat"})
+    name, _ = queue.claim()
+    os.rename(os.path.join(spool, "running", name), os.path.join(spool, "incoming", name))
+
+    queue.finish(name, {"error": "interrupted"}, failed=True)
+
+    assert os.listdir(os.path.join(spool, "failed")) == [name]
+    assert os.listdir(os.path.join(spool, "running")) == []
@@ -0,0 +1,36 @@
+from utilities.spriteindex.spriteindex import SpriteIndex
+
+
+def _digest(flipped_bits: range) -> str:
+    value = 0
+    for bit in flipped_bits:
+        value |= 1 << bit
+    return f"{value:064x}"
+
+
+def test_duplicates_do_not_chain_through_intermediate_sheets(tmp_path):
+    index = SpriteIndex(str(tmp_path / "index.sqlite"))
+    # each step flips 10 more bits: neighbours are 10 apart, the ends 20
+    hashes = {"a.png": _digest(range(0)), "b.png": _digest(range(10)), "c.png": _digest(range(20)),
+              "d.png": _digest(range(100, 200))}
+    index.entries = lambda: [dict(path=path, dhash=digest) for path, digest in sorted(hashes.items())]
+
+    groups = index.duplicates(max_distance=15)
+
+    assert [[entry["path"] for entry in group] for group in groups] in ([["a.png", "b.png"]], [["b.png", "c.png"]])
+    for group in groups:
+        digests = [entry["dhash"] for entry in group]
+        assert index.hash_distances(digests).max() <= 15
+    index.close()
+
+
+def test_duplicates_groups_identical_sheets(tmp_path):
+    index = SpriteIndex(str(tmp_path / "index.sqlite"))
+    hashes = {"a.png": _digest(range(5)), "a_copy.png": _digest(range(5)), "a_resized.png": _digest(range(7)),
+              "other.png": _digest(range(100, 200))}
+    index.entries = lambda: [dict(path=path, dhash=digest) for path, digest in sorted(hashes.items())]
+
+    groups = index.duplicates(max_distance=4)
+
+    assert [[entry["path"] for entry in group] for group in groups] == [["a.png", "a_copy.png", "a_resized.png"]]
+    index.close()
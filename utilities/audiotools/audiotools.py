@@ -0,0 +1,43 @@
+from pydub import AudioSegment
+
+
+class AudioTools:
+    """
+    Array based helpers for pydub AudioSegments.
+    """
+
+    @staticmethod
+    def tile_to_duration(audio, duration_seconds: float):
+
+        """
+        Loop or trim an AudioSegment to an exact duration.
+
+        The raw frames are tiled into one buffer of exactly the needed size, filled by copying
+        its own filled part forward, instead of repeating the segment and then cutting it.
+
+        Args:
+            audio (AudioSegment): Segment to loop.
+            duration_seconds (float): Duration of the result in seconds.
+
+        Returns:
+            AudioSegment: Segment of the requested duration.
+
+        Raises:
+            ValueError: If the segment is empty.
+        """
+
+        raw_data = audio.raw_data
+        if len(raw_data) == 0:
+            raise ValueError("Cannot loop an empty audio segment.")
+        # whole frames, so the length stays exact for the muxer
+        size = int(round(duration_seconds * audio.frame_rate)) * audio.frame_width
+        tiled = bytearray(size)
+        with memoryview(tiled) as view:
+            filled = min(len(raw_data), size)
+            view[:filled] = memoryview(raw_data)[:filled]
+            while filled < size:
+                step = min(filled, size - filled)
+                view[filled:filled + step] = view[:step]
+                filled += step
+        return AudioSegment(data=tiled, sample_width=audio.sample_width, frame_rate=audio.frame_rate,
+                            channels=audio.channels)
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+
+class ChorusCache:
+    """
+    Persistent cache of chorus start offsets, keyed by the content hash of the audio file.
+
+    pychorus builds a chroma of the whole track to find its chorus, which takes seconds per
+    call. The result only depends on the audio content and the clip length, so it is stored
+    in a small JSON file and reused whenever the same track is added to another video.
+    Processes sharing the file merge their offsets into it under a file lock, so concurrent
+    renders do not drop each other's results.
+
+    Attributes:
+        cache_path (str): Path of the JSON file holding the offsets.
+        hits (int): Number of lookups served from the cache.
+        misses (int): Number of lookups that ran the chorus analysis.
+    """
+
+    def __init__(self, cache_path: str = ".chorus_cache.json"):
+        self.cache_path = cache_path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._offsets = None
+
+    @staticmethod
+    def content_hash(path: str) -> str:
+
+        """
+        Hash the content of a file.
+
+        Args:
+            path (str): Path of the file.
+
+        Returns:
+            str: Hex SHA-256 digest of the file content.
+        """
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def chorus_start(self, audio_path: str, clip_length: float = 15) -> float:
+
+        """
+        Find the start of the chorus of a track.
+
+        Args:
+            audio_path (str): Path of the audio file.
+            clip_length (float): Minimum chorus length in seconds.
+
+        Returns:
+            float: Chorus start in seconds, or None when no chorus was found.
+        """
+
+        key = f"{self.content_hash(audio_path)}:{clip_length:g}"
+        with self._lock:
+            offsets = self._load()
+            if key in offsets:
+                self.hits += 1
+                return offsets[key]
+
+        from pychorus import find_and_output_chorus
+
+        start = find_and_output_chorus(audio_path, None, clip_length)
+        with self._lock:
+            self.misses += 1
+            offsets[key] = float(start) if start is not None else None
+            self._save()
+        return offsets[key]
+
+    def _load(self) -> dict:
+        if self._offsets is None:
+            self._offsets = self._read()
+        return self._offsets
+
+    def _read(self) -> dict:
+        if not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable chorus cache {self.cache_path}: {e}")
+            return {}
+
+    @contextmanager
+    def _file_lock(self):
+        with open(f"{self.cache_path}.lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.cache_path))
+        with self._file_lock():
+            # offsets only depend on the audio content, so merging is a plain union
+            self._offsets = dict(self._read(), **self._offsets)
+            file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".chorus.", suffix=".tmp")
+            try:
+                with os.fdopen(file_descriptor, "w") as f:
+                    json.dump(self._offsets, f)
+                os.replace(temp_path, self.cache_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
@@ -0,0 +1,103 @@
+import base64
+import hashlib
+import os
+import tempfile
+
+
+class AssetDownloader:
+    """
+    Downloads generated assets over a shared keep-alive session.
+
+    Responses are streamed in chunks into a temporary file next to the destination and
+    renamed into place only after the size (Content-Length) and, when given, the SHA-256
+    checksum match, so a failed download never leaves a truncated file behind.
+
+    Attributes:
+        session (requests.Session): Session with a pooled HTTP adapter, created on first use.
+        timeout (tuple): Connect and read timeouts in seconds.
+        chunk_size (int): Size of the chunks written to disk.
+    """
+
+    def __init__(self, pool_size: int = 16, timeout: tuple = (10, 60), chunk_size: int = 256 * 1024):
+        self.pool_size = pool_size
+        self._session = None
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+        return self._session
+
+    def download(self, url: str, destination: str, sha256: str = None) -> str:
+
+        """
+        Stream a URL to a file.
+
+        Args:
+            url (str): URL to download.
+            destination (str): Path of the downloaded file.
+            sha256 (str): Expected hex digest of the content, not checked when omitted.
+
+        Returns:
+            str: The destination path.
+
+        Raises:
+            ValueError: If the request fails or the content does not match the expected size or checksum.
+        """
+
+        with self.session.get(url, stream=True, timeout=self.timeout) as response:
+            if response.status_code != 200:
+                raise ValueError(
+                    f"Failed to download image from {url}. Status code: {response.status_code}")
+            expected_size = response.headers.get("Content-Length")
+            if response.headers.get("Content-Encoding"):
+                expected_size = None
+            return self._write_atomic(destination, response.iter_content(self.chunk_size),
+                                      int(expected_size) if expected_size else None, sha256, url)
+
+    def save_base64(self, data: str, destination: str, sha256: str = None) -> str:
+
+        """
+        Write base64 encoded content (e.g. a b64_json image response) to a file.
+
+        Args:
+            data (str): Base64 encoded content.
+            destination (str): Path of the written file.
+            sha256 (str): Expected hex digest of the decoded content, not checked when omitted.
+
+        Returns:
+            str: The destination path.
+        """
+
+        content = base64.b64decode(data)
+        return self._write_atomic(destination, [content], len(content), sha256, "base64 data")
+
+    def _write_atomic(self, destination: str, chunks, expected_size: int, sha256: str, source: str) -> str:
+        directory = os.path.dirname(os.path.abspath(destination))
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        try:
+            with os.fdopen(file_descriptor, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+            if expected_size is not None and size != expected_size:
+                raise ValueError(f"Incomplete download from {source}: got {size} of {expected_size} bytes")
+            if sha256 and digest.hexdigest() != sha256.lower():
+                raise ValueError(f"Checksum mismatch for {source}")
+            os.replace(temp_path, destination)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return destination
@@ -0,0 +1,361 @@
+import math
+import os
+import re
+import subprocess
+import tempfile
+
+
+class FFmpegTools:
+    """
+    Thin wrapper around the ffmpeg binary for streaming frames and running encodes.
+
+    Attributes:
+        executable (str): Path of the ffmpeg binary. Defaults to the one bundled with
+            imageio-ffmpeg (which moviepy already depends on), or ``ffmpeg`` on the PATH.
+    """
+
+    def __init__(self, executable: str = None):
+        self.executable = executable or self.find_executable()
+
+    @staticmethod
+    def find_executable() -> str:
+
+        """
+        Locate the ffmpeg binary.
+
+        Returns:
+            str: Path or name of the ffmpeg binary.
+        """
+
+        try:
+            import imageio_ffmpeg
+            return imageio_ffmpeg.get_ffmpeg_exe()
+        except (ImportError, RuntimeError):
+            return "ffmpeg"
+
+    def run(self, args: list):
+
+        """
+        Run ffmpeg with the given arguments and raise if it fails.
+
+        Args:
+            args (list): Arguments passed after the executable.
+
+        Raises:
+            IOError: If ffmpeg exits with a non-zero status.
+        """
+
+        command = [self.executable, "-y", "-loglevel", "error", *args]
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise IOError(f"ffmpeg failed ({result.returncode}): {result.stderr.decode(errors='replace').strip()}")
+
+    def probe(self, path: str) -> dict:
+
+        """
+        Read the stream parameters of a media file from the ffmpeg banner.
+
+        Args:
+            path (str): Path of the media file.
+
+        Returns:
+            dict: duration, video_codec, width, height, fps, pix_fmt, audio_codec, sample_rate and
+            channels. Values ffmpeg does not report are None.
+
+        Raises:
+            IOError: If the file cannot be opened.
+        """
+
+        result = subprocess.run([self.executable, "-hide_banner", "-i", path], stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE)
+        banner = result.stderr.decode(errors="replace")
+        if "Invalid data" in banner or "No such file" in banner:
+            raise IOError(f"ffmpeg could not read {path}: {banner.strip().splitlines()[-1]}")
+
+        info = dict(duration=None, video_codec=None, width=None, height=None, fps=None, pix_fmt=None,
+                    audio_codec=None, sample_rate=None, channels=None)
+        duration = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", banner)
+        if duration:
+            hours, minutes, seconds = duration.groups()
+            info["duration"] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+        for line in banner.splitlines():
+            stream = re.search(r"Stream #\S+.*?: (Video|Audio): (.*)", line)
+            if not stream:
+                continue
+            # drop parenthesized details, which may themselves contain commas
+            details = stream.group(2)
+            while re.search(r"\([^()]*\)", details):
+                details = re.sub(r"\([^()]*\)", "", details)
+            fields = [field.strip() for field in details.split(",")]
+            if stream.group(1) == "Video" and info["video_codec"] is None:
+                info["video_codec"] = fields[0].split()[0]
+                info["pix_fmt"] = fields[1].split()[0] if len(fields) > 1 else None
+                size = re.search(r"(\d{2,5})x(\d{2,5})", details)
+                if size:
+                    info["width"], info["height"] = int(size.group(1)), int(size.group(2))
+                fps = re.search(r"([\d.]+)(k?) (?:fps|tbr)", details)
+                if fps:
+                    info["fps"] = float(fps.group(1)) * (1000 if fps.group(2) else 1)
+            elif stream.group(1) == "Audio" and info["audio_codec"] is None:
+                info["audio_codec"] = fields[0].split()[0]
+                sample_rate = re.search(r"(\d+) Hz", details)
+                info["sample_rate"] = int(sample_rate.group(1)) if sample_rate else None
+                info["channels"] = fields[2] if len(fields) > 2 else None
+        return info
+
+    def write_frames(self, frames, output_path: str, width: int, height: int, frame_rate: str,
+                     codec_args: list = None):
+
+        """
+        Stream raw RGB frames into an ffmpeg encoder.
+
+        Args:
+            frames (iterable): uint8 arrays of shape (height, width, 3).
+            output_path (str): Path of the encoded video.
+            width (int): Frame width, must be even for yuv420p output.
+            height (int): Frame height, must be even for yuv420p output.
+            frame_rate (str): Input frame rate, may be a fraction such as "1000/150".
+            codec_args (list): Encoder arguments, libx264/yuv420p when omitted.
+
+        Returns:
+            int: Number of frames written.
+
+        Raises:
+            IOError: If ffmpeg exits with a non-zero status.
+        """
+
+        codec_args = codec_args or ["-c:v", "libx264", "-pix_fmt", "yuv420p"]
+        command = [
+            self.executable, "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-framerate", str(frame_rate),
+            "-i", "-", "-an", *codec_args, output_path,
+        ]
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE)
+        frame_count = 0
+        try:
+            for frame in frames:
+                process.stdin.write(frame.tobytes())
+                frame_count += 1
+        except BrokenPipeError:
+            pass
+        finally:
+            process.stdin.close()
+            stderr = process.stderr.read()
+            process.wait()
+
+        if process.returncode != 0:
+            raise IOError(f"ffmpeg failed ({process.returncode}): {stderr.decode(errors='replace').strip()}")
+        return frame_count
+
+    def write_frames_vfr(self, frames, durations, output_path: str, codec_args: list = None,
+                         total_duration: float = None) -> int:
+
+        """
+        Encode frames that each have their own duration into a variable frame rate video.
+
+        Every frame is written once as a PPM image and timed through an ffmpeg concat list, so
+        a pose held for several cells costs one encoded frame instead of one per cell.
+
+        Args:
+            frames (sequence): uint8 arrays of shape (height, width, 3), with even sizes for yuv420p.
+            durations (sequence): Duration of every frame in seconds.
+            output_path (str): Path of the encoded video.
+            codec_args (list): Encoder arguments, libx264/yuv420p when omitted.
+            total_duration (float): Repeat the frames up to this many seconds, a single pass when omitted.
+
+        The output ends with a copy of the last frame at total_duration. When the output is looped
+        with loop_by_stream_copy(trim_cycles=True), encode it with "-bf 0" so that frame is cut.
+
+        Returns:
+            int: Number of timed frames in the output.
+
+        Raises:
+            IOError: If ffmpeg exits with a non-zero status.
+        """
+
+        codec_args = codec_args or ["-c:v", "libx264", "-pix_fmt", "yuv420p"]
+        cycle_duration = sum(durations)
+        total_duration = total_duration or cycle_duration
+        with tempfile.TemporaryDirectory() as temp_dir:
+            names = []
+            for index, frame in enumerate(frames):
+                name = f"{index}.ppm"
+                with open(os.path.join(temp_dir, name), "wb") as f:
+                    f.write(f"P6\n{frame.shape[1]} {frame.shape[0]}\n255\n".encode("ascii"))
+                    f.write(frame.tobytes())
+                names.append(name)
+
+            # a millisecond time base for the images keeps the durations exact
+            entries = []
+            elapsed = 0.0
+            while elapsed < total_duration - 1e-6:
+                for name, duration in zip(names, durations):
+                    duration = min(duration, total_duration - elapsed)
+                    if duration <= 1e-6:
+                        break
+                    entries.append(f"file '{name}'\noption framerate 1000\nduration {duration:.6f}\n")
+                    elapsed += duration
+            # the last entry only ends at the start of the next one, so the last frame is listed
+            # again at total_duration
+            entries.append(entries[-1].rsplit("duration", 1)[0])
+            list_path = os.path.join(temp_dir, "frames.txt")
+            with open(list_path, "w") as f:
+                f.write("ffconcat version 1.0\n")
+                f.writelines(entries)
+            self.run(["-f", "concat", "-safe", "0", "-i", list_path, "-an", "-fps_mode", "vfr", *codec_args,
+                      output_path])
+        return len(entries) - 1
+
+    def mux_audio_pcm(self, video_path: str, pcm: bytes, sample_rate: int, channels: int, sample_width: int,
+                      output_path: str, audio_args: list = None):
+
+        """
+        Replace the audio of a video with raw PCM piped from memory, copying the video stream.
+
+        Args:
+            video_path (str): Path of the source video. Its video stream is copied untouched.
+            pcm (bytes): Interleaved little-endian PCM samples.
+            sample_rate (int): Sample rate of the PCM data in Hz.
+            channels (int): Number of interleaved channels.
+            sample_width (int): Bytes per sample (1, 2 or 4).
+            output_path (str): Path of the muxed video.
+            audio_args (list): Audio encoder arguments, AAC when omitted.
+
+        Raises:
+            ValueError: If the sample width is not supported.
+            IOError: If ffmpeg exits with a non-zero status.
+        """
+
+        sample_formats = {1: "u8", 2: "s16le", 4: "s32le"}
+        if sample_width not in sample_formats:
+            raise ValueError(f"Unsupported sample width: {sample_width}")
+        audio_args = audio_args or ["-c:a", "aac"]
+        command = [
+            self.executable, "-y", "-loglevel", "error",
+            "-i", video_path,
+            "-f", sample_formats[sample_width], "-ar", str(sample_rate), "-ac", str(channels), "-i", "-",
+            "-map", "0:v:0", "-map", "1:a:0", "-c:v", "copy", *audio_args, "-shortest",
+            "-movflags", "+faststart", output_path,
+        ]
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE)
+        try:
+            _, stderr = process.communicate(input=pcm)
+        except BrokenPipeError:
+            stderr = process.stderr.read()
+            process.wait()
+        if process.returncode != 0:
+            raise IOError(f"ffmpeg failed ({process.returncode}): {stderr.decode(errors='replace').strip()}")
+
+    @staticmethod
+    def gif_timing(input_gif: str) -> tuple:
+
+        """
+        Read the frame count and the length of one cycle of a GIF.
+
+        Args:
+            input_gif (str): Path to the GIF file.
+
+        Returns:
+            tuple: Number of frames and cycle duration in seconds.
+        """
+
+        from PIL import Image, ImageSequence
+
+        with Image.open(input_gif) as gif:
+            durations = [frame.info.get("duration", 100) for frame in ImageSequence.Iterator(gif)]
+        return len(durations), sum(durations) / 1000.0
+
+    def encode_gif_cycle(self, input_gif: str, output_path: str, codec_args: list = None) -> tuple:
+
+        """
+        Encode one cycle of a GIF with a single keyframe at its start.
+
+        Args:
+            input_gif (str): Path to the GIF file.
+            output_path (str): Path of the encoded cycle.
+            codec_args (list): Encoder arguments, libx264/yuv420p when omitted.
+
+        Returns:
+            tuple: Number of frames and duration of the cycle in seconds.
+        """
+
+        frame_count, cycle_duration = self.gif_timing(input_gif)
+        codec_args = codec_args or ["-c:v", "libx264", "-pix_fmt", "yuv420p"]
+        self.run([
+            "-i", input_gif, "-an", "-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2", *codec_args,
+            *self.cycle_gop_args(frame_count), output_path,
+        ])
+        return frame_count, cycle_duration
+
+    @staticmethod
+    def cycle_gop_args(frame_count: int) -> list:
+
+        """
+        Encoder arguments that keep one GOP per animation cycle, without B-frames.
+
+        The reordering delay of B-frames shifts the packet timestamps, so a stream copy cut with
+        "-t" would keep frames past the target duration.
+
+        Args:
+            frame_count (int): Number of frames in one cycle.
+
+        Returns:
+            list: ffmpeg arguments.
+        """
+
+        return ["-g", str(frame_count), "-keyint_min", str(frame_count), "-sc_threshold", "0", "-bf", "0"]
+
+    def concat_copy(self, input_paths: list, output_path: str, duration: float = None, outpoint: float = None,
+                    input_durations: list = None):
+
+        """
+        Concatenate files with identical stream parameters without re-encoding.
+
+        Args:
+            input_paths (list): Paths of the files, in playback order.
+            output_path (str): Path of the concatenated file.
+            duration (float): Cut the output at this many seconds when given.
+            outpoint (float): Drop the packets of every input from this many seconds on (by decode timestamp).
+            input_durations (list): Length of every input in seconds, used to place the next input instead
+                of the input's last timestamp (e.g. after trailing frames were dropped).
+        """
+
+        list_file = tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False)
+        try:
+            with list_file:
+                for index, path in enumerate(input_paths):
+                    escaped = os.path.abspath(path).replace("'", "'\\''")
+                    list_file.write(f"file '{escaped}'\n")
+                    if input_durations:
+                        list_file.write(f"duration {input_durations[index]:.6f}\n")
+                    if outpoint:
+                        list_file.write(f"outpoint {outpoint:.6f}\n")
+            trim = ["-t", f"{duration:.3f}"] if duration else []
+            self.run(["-f", "concat", "-safe", "0", "-i", list_file.name, "-c", "copy", *trim,
+                      "-movflags", "+faststart", output_path])
+        finally:
+            os.remove(list_file.name)
+
+    def loop_by_stream_copy(self, cycle_path: str, output_path: str, cycle_duration: float,
+                            target_duration: float, trim_cycles: bool = False):
+
+        """
+        Repeat an encoded cycle up to the target duration at the container level.
+
+        The cycle must be encoded without B-frames (see cycle_gop_args), otherwise the cut lands
+        past target_duration.
+
+        Args:
+            cycle_path (str): Path of the encoded cycle.
+            output_path (str): Path of the looped file.
+            cycle_duration (float): Duration of the cycle in seconds.
+            target_duration (float): Duration of the looped file in seconds.
+            trim_cycles (bool): Cut every cycle at cycle_duration, for cycles from write_frames_vfr.
+        """
+
+        repeats = max(1, math.ceil(target_duration / cycle_duration))
+        self.concat_copy([cycle_path] * repeats, output_path, duration=target_duration,
+                         outpoint=cycle_duration if trim_cycles else None)
@@ -0,0 +1,81 @@
+import numpy as np
+
+
+class FrameDeduplicator:
+    """
+    Collapses runs of identical or near-identical consecutive frames.
+
+    Sprite animations often repeat a pose for several cells. Each frame is compared with the
+    previous kept frame and the durations of dropped frames are added to the kept one, so
+    the timing is unchanged while the encoder sees fewer frames.
+
+    Attributes:
+        threshold (float): Largest mean absolute difference (0-255 scale) between two frames
+            that still counts as a duplicate. 0 only drops exact duplicates.
+    """
+
+    CHUNK_BYTES = 64 * 1024 ** 2
+
+    def __init__(self, threshold: float = 0.0):
+        self.threshold = threshold
+
+    def differences(self, frames) -> np.ndarray:
+
+        """
+        Mean absolute difference between every frame and the one before it.
+
+        Args:
+            frames (sequence): Equally shaped uint8 arrays.
+
+        Returns:
+            np.ndarray: float array of length len(frames) - 1.
+        """
+
+        stack = np.stack(frames)
+        pixels = stack.reshape(len(stack), -1)
+        if self.threshold == 0:
+            return (pixels[1:] != pixels[:-1]).any(axis=1).astype(np.float64)
+        diffs = np.empty(len(stack) - 1)
+        # compare in chunks of frame pairs to bound the size of the int16 temporaries
+        chunk = max(1, self.CHUNK_BYTES // (2 * pixels.shape[1]))
+        for start in range(0, len(diffs), chunk):
+            end = min(start + chunk, len(diffs))
+            diffs[start:end] = np.abs(pixels[start + 1:end + 1].astype(np.int16) - pixels[start:end]).mean(axis=1)
+        return diffs
+
+    def dedupe(self, frames, durations) -> tuple:
+
+        """
+        Drop duplicate frames and merge their durations into the previous kept frame.
+
+        Args:
+            frames (sequence): Equally shaped uint8 arrays.
+            durations (sequence): Duration of every frame.
+
+        Returns:
+            tuple: Kept frames and their durations.
+        """
+
+        if len(frames) < 2:
+            return list(frames), list(durations)
+        diffs = self.differences(frames)
+        kept, kept_durations = [frames[0]], [durations[0]]
+        reference = 0
+        for index in range(1, len(frames)):
+            # compare with the last kept frame, so slow drifts still add up to a change
+            if reference == index - 1:
+                difference = diffs[index - 1]
+            else:
+                difference = self._difference(frames[reference], frames[index])
+            if difference <= self.threshold:
+                kept_durations[-1] += durations[index]
+            else:
+                kept.append(frames[index])
+                kept_durations.append(durations[index])
+                reference = index
+        return kept, kept_durations
+
+    def _difference(self, first, second) -> float:
+        if self.threshold == 0:
+            return float(not np.array_equal(first, second))
+        return float(np.abs(second.astype(np.int16) - first).mean())
@@ -0,0 +1,153 @@
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from PIL import Image
+
+
+class SpriteFrameStore:
+    """
+    Holds the frames of a sprite sheet as strided views into a single sheet array.
+
+    The sheet is decoded once; ``grid`` is a read-only view of shape
+    (rows, cols, cell_height, cell_width, channels) over that array, so no frame is copied
+    until it is converted for output. Pixels left over when the sheet size is not a multiple
+    of the grid (partial edge cells) are not part of any frame.
+
+    Attributes:
+        sheet (np.ndarray): Decoded sprite sheet, RGB or RGBA.
+        grid (np.ndarray): Strided frame view over the sheet.
+    """
+
+    def __init__(self):
+        self.sheet = None
+        self.grid = None
+
+    def load(self, spritesheet_path: str, rows: int, cols: int):
+
+        """
+        Decode a sprite sheet and index its frames.
+
+        Args:
+            spritesheet_path (str): Path to the sprite sheet image.
+            rows (int): Number of rows in the sprite sheet.
+            cols (int): Number of columns in the sprite sheet.
+
+        Raises:
+            ValueError: If the grid is empty or larger than the sheet.
+        """
+
+        with Image.open(spritesheet_path) as spritesheet:
+            has_alpha = "A" in spritesheet.getbands() or "transparency" in spritesheet.info
+            self.load_array(np.asarray(spritesheet.convert("RGBA" if has_alpha else "RGB")), rows, cols)
+
+    def load_array(self, sheet: np.ndarray, rows: int, cols: int):
+
+        """
+        Index the frames of an already decoded sprite sheet.
+
+        Args:
+            sheet (np.ndarray): Array of shape (height, width, channels).
+            rows (int): Number of rows in the sprite sheet.
+            cols (int): Number of columns in the sprite sheet.
+
+        Raises:
+            ValueError: If the grid is empty or larger than the sheet.
+        """
+
+        height, width, channels = sheet.shape
+        if rows <= 0 or cols <= 0 or rows > height or cols > width:
+            raise ValueError(f"Invalid sprite grid {rows}x{cols} for a {width}x{height} sheet.")
+        cell_height, cell_width = height // rows, width // cols
+        row_stride, col_stride, channel_stride = sheet.strides
+        self.sheet = sheet
+        self.grid = as_strided(
+            sheet,
+            shape=(rows, cols, cell_height, cell_width, channels),
+            strides=(cell_height * row_stride, cell_width * col_stride, row_stride, col_stride, channel_stride),
+            writeable=False,
+        )
+
+    def load_frames(self, frames: np.ndarray, cols: int):
+
+        """
+        Index frames that were already processed as one batch, such as composited frames.
+
+        Args:
+            frames (np.ndarray): Array of shape (frames, cell_height, cell_width, channels) in reading order.
+            cols (int): Number of columns of the grid the frames came from.
+
+        Raises:
+            ValueError: If the frames do not fill whole rows of the grid.
+        """
+
+        if cols <= 0 or len(frames) == 0 or len(frames) % cols:
+            raise ValueError(f"{len(frames)} frames do not fill rows of {cols} columns.")
+        self.sheet = frames
+        self.grid = frames.reshape(len(frames) // cols, cols, *frames.shape[1:])
+
+    def reset(self):
+
+        """
+        Drop the frames of the previous run.
+        """
+
+        self.sheet = None
+        self.grid = None
+
+    @property
+    def cell_width(self) -> int:
+        return self.grid.shape[3] if self.grid is not None else 0
+
+    @property
+    def cell_height(self) -> int:
+        return self.grid.shape[2] if self.grid is not None else 0
+
+    def __len__(self) -> int:
+        if self.grid is None:
+            return 0
+        return self.grid.shape[0] * self.grid.shape[1]
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        if not -len(self) <= index < len(self):
+            raise IndexError("frame index out of range")
+        row, col = divmod(index % len(self), self.grid.shape[1])
+        return self.grid[row, col]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def stack(self) -> np.ndarray:
+
+        """
+        Copy the frames into one contiguous array for batched processing.
+
+        Returns:
+            np.ndarray: Array of shape (frames, cell_height, cell_width, channels).
+        """
+
+        return self.grid.reshape(len(self), *self.grid.shape[2:])
+
+    def to_pil(self, index: int) -> Image.Image:
+
+        """
+        Convert one frame to a PIL image.
+
+        Args:
+            index (int): Frame index in reading order.
+
+        Returns:
+            Image.Image: The frame.
+        """
+
+        return Image.fromarray(np.ascontiguousarray(self[index]))
+
+    def pil_frames(self) -> list:
+
+        """
+        Convert every frame to a PIL image.
+
+        Returns:
+            list: Frames in reading order.
+        """
+
+        return [self.to_pil(index) for index in range(len(self))]
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+
+class GenerationCache:
+    """
+    Content-addressed on-disk cache for generated sprite sheets.
+
+    Entries are keyed by the hash of the generation parameters (model, sanitized prompt,
+    size and quality) and stored as ``<cache_directory>/<key>.png``. An ``index.json`` file
+    keeps the size of every entry so the cache can be trimmed to ``max_bytes`` (least
+    recently used first) and entries older than ``max_age`` dropped. A hit only touches the
+    mtime of the cached file, which serves as its access time, so lookups never rewrite the index.
+    Several processes may share the directory: the index is re-read and merged under a file
+    lock before every write, so entries added or evicted by another process are not lost.
+
+    Attributes:
+        cache_directory (str): Directory holding the cached files and the index.
+        max_bytes (int): Upper bound for the total size of the cached files.
+        max_age (float): Maximum age of an entry in seconds, None keeps entries forever.
+        hits (int): Number of lookups served from the cache.
+        misses (int): Number of lookups not found in the cache.
+    """
+
+    INDEX_NAME = "index.json"
+    LOCK_NAME = "index.lock"
+
+    def __init__(self, cache_directory: str = ".generation_cache", max_bytes: int = 2 * 1024 ** 3,
+                 max_age: float = None):
+        self.cache_directory = cache_directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_directory, exist_ok=True)
+        self._index_path = os.path.join(self.cache_directory, self.INDEX_NAME)
+        self._lock_path = os.path.join(self.cache_directory, self.LOCK_NAME)
+        self._index = self._load_index()
+        # keys evicted since the last save, so merging the index on disk does not bring them back
+        self._removed = set()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, size: str, quality: str) -> str:
+
+        """
+        Build the cache key for a generation request.
+
+        Args:
+            model (str): Image model name.
+            prompt (str): Sanitized prompt.
+            size (str): Size of the generated image (e.g., "1024x1024").
+            quality (str): Quality of the generated image (e.g., "standard").
+
+        Returns:
+            str: Hex digest identifying the request.
+        """
+
+        payload = json.dumps([model, prompt, size, quality])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, destination: str) -> str:
+
+        """
+        Copy a cached file to the destination path.
+
+        Args:
+            key (str): Cache key from make_key.
+            destination (str): Path to copy the cached file to.
+
+        Returns:
+            str: The destination path, or None when the key is not cached.
+        """
+
+        with self._lock:
+            entry = self._index.get(key)
+            cached_path = self._entry_path(key)
+            now = time.time()
+            if entry is None or self._expired(entry, now):
+                self.misses += 1
+                return None
+            try:
+                os.utime(cached_path, (now, now))
+            except FileNotFoundError:
+                # evicted by another process
+                self.misses += 1
+                return None
+            entry["last_access"] = now
+            self.hits += 1
+
+        if os.path.abspath(cached_path) != os.path.abspath(destination):
+            shutil.copyfile(cached_path, destination)
+        return destination
+
+    def put(self, key: str, source_path: str, **metadata) -> str:
+
+        """
+        Store a file in the cache and evict entries if the cache grew too large.
+
+        Args:
+            key (str): Cache key from make_key.
+            source_path (str): File to store.
+            **metadata: Extra values saved in the index next to the entry.
+
+        Returns:
+            str: Path of the cached copy.
+        """
+
+        cached_path = self._entry_path(key)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.cache_directory, suffix=".tmp")
+        os.close(file_descriptor)
+        try:
+            shutil.copyfile(source_path, temp_path)
+            os.replace(temp_path, cached_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        now = time.time()
+        with self._lock:
+            self._index[key] = dict(metadata, bytes=os.path.getsize(cached_path), created=now, last_access=now)
+            self._evict()
+            self._save_index()
+        return cached_path
+
+    def evict(self):
+
+        """
+        Drop expired entries and trim the cache to max_bytes.
+        """
+
+        with self._lock:
+            self._evict()
+            self._save_index()
+
+    def stats(self) -> dict:
+
+        """
+        Report the cache counters.
+
+        Returns:
+            dict: Hits, misses, number of entries and total bytes.
+        """
+
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._index),
+                "bytes": sum(entry["bytes"] for entry in self._index.values()),
+            }
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_directory, f"{key}.png")
+
+    def _expired(self, entry: dict, now: float) -> bool:
+        return self.max_age is not None and now - entry["created"] > self.max_age
+
+    def _evict(self):
+        now = time.time()
+        for key in [key for key, entry in self._index.items() if self._expired(entry, now)]:
+            self._remove(key)
+
+        total_bytes = sum(entry["bytes"] for entry in self._index.values())
+        for key, entry in sorted(self._index.items(), key=lambda item: self._last_access(*item)):
+            if total_bytes <= self.max_bytes:
+                break
+            total_bytes -= entry["bytes"]
+            self._remove(key)
+
+    def _last_access(self, key: str, entry: dict) -> float:
+        # hits from every process touch the file, the index only knows the hits of this one
+        try:
+            return max(entry["last_access"], os.path.getmtime(self._entry_path(key)))
+        except OSError:
+            return entry["last_access"]
+
+    def _remove(self, key: str):
+        self._index.pop(key, None)
+        self._removed.add(key)
+        cached_path = self._entry_path(key)
+        if os.path.exists(cached_path):
+            os.remove(cached_path)
+
+    def _load_index(self) -> dict:
+        if not os.path.exists(self._index_path):
+            return {}
+        try:
+            with open(self._index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable cache index {self._index_path}: {e}")
+            return {}
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self._lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _save_index(self):
+        with self._file_lock():
+            merged = self._load_index()
+            for key in self._removed:
+                merged.pop(key, None)
+            for key, entry in self._index.items():
+                current = merged.get(key)
+                if current is None or entry["last_access"] >= current["last_access"]:
+                    merged[key] = entry
+            # entries another process evicted since this one loaded them have lost their file
+            self._index = {key: entry for key, entry in merged.items() if os.path.exists(self._entry_path(key))}
+            self._removed.clear()
+
+            file_descriptor, temp_path = tempfile.mkstemp(dir=self.cache_directory, prefix="index.", suffix=".tmp")
+            try:
+                with os.fdopen(file_descriptor, "w") as f:
+                    json.dump(self._index, f)
+                os.replace(temp_path, self._index_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class ArtifactManifest:
+    """
+    SQLite record of finished pipeline stages, used to skip work on a rerun.
+
+    Every row is keyed by the hash of a stage's inputs (its parameters and the fingerprints
+    of the stages it depends on) and keeps the stage's result, its output paths and a hash
+    of the output contents. A stage can be skipped when a row exists for its input hash and
+    every output still exists with the recorded content.
+
+    Attributes:
+        path (str): Path of the SQLite database.
+    """
+
+    def __init__(self, path: str = "manifest.sqlite"):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts ("
+                "input_hash TEXT PRIMARY KEY, stage TEXT NOT NULL, value TEXT, outputs TEXT NOT NULL, "
+                "output_hash TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def hash_inputs(stage: str, params: dict, dependency_fingerprints: list) -> str:
+
+        """
+        Hash the inputs of a stage.
+
+        Args:
+            stage (str): Kind of the stage (e.g. "sheet" or "video").
+            params (dict): JSON-serializable parameters of the stage.
+            dependency_fingerprints (list): Fingerprints of the stages it depends on, in order.
+
+        Returns:
+            str: Hex SHA-256 digest.
+        """
+
+        payload = json.dumps([stage, params, dependency_fingerprints], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def hash_outputs(value, outputs: list) -> str:
+
+        """
+        Fingerprint the result of a stage from its value and the content of its output files.
+
+        Args:
+            value: JSON-serializable result of the stage.
+            outputs (list): Paths of the files the stage wrote.
+
+        Returns:
+            str: Hex SHA-256 digest, or None when an output file is missing.
+        """
+
+        digest = hashlib.sha256(json.dumps(value, sort_keys=True).encode("utf-8"))
+        for path in outputs:
+            if not os.path.isfile(path):
+                return None
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    def lookup(self, input_hash: str):
+
+        """
+        Find a finished stage whose outputs are still intact.
+
+        Args:
+            input_hash (str): Input hash from hash_inputs.
+
+        Returns:
+            tuple: The stage value and its fingerprint, or None when the stage must run.
+        """
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, outputs, output_hash FROM artifacts WHERE input_hash = ?", (input_hash,)
+            ).fetchone()
+        if row is None:
+            return None
+        value, outputs = json.loads(row[0]), json.loads(row[1])
+        if self.hash_outputs(value, outputs) != row[2]:
+            return None
+        return value, row[2]
+
+    def record(self, input_hash: str, stage: str, value, outputs: list) -> str:
+
+        """
+        Store a finished stage.
+
+        Args:
+            input_hash (str): Input hash from hash_inputs.
+            stage (str): Name of the stage, kept for inspection.
+            value: JSON-serializable result of the stage.
+            outputs (list): Paths of the files the stage wrote.
+
+        Returns:
+            str: Fingerprint of the stage result.
+
+        Raises:
+            ValueError: If an output file is missing.
+        """
+
+        output_hash = self.hash_outputs(value, outputs)
+        if output_hash is None:
+            raise ValueError(f"Stage {stage} did not write all of its outputs: {outputs}")
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?, ?)",
+                (input_hash, stage, json.dumps(value), json.dumps(outputs), output_hash, time.time()),
+            )
+        return output_hash
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
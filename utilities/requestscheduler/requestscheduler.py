@@ -0,0 +1,182 @@
+import email.utils
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+NON_RETRIABLE_STATUS = {400, 401, 403, 404, 422}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting the request rate of one provider.
+
+    Attributes:
+        rate (float): Tokens added per second.
+        capacity (float): Maximum number of stored tokens (burst size).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+
+        """
+        Block until a token is available and take it.
+        """
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+
+        """
+        Hold back every caller for the given time, e.g. after a Retry-After response.
+
+        Args:
+            seconds (float): Time to pause in seconds.
+        """
+
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class RequestScheduler:
+    """
+    Client-side scheduler shared by every call to a rate limited API.
+
+    Each provider gets a token bucket and a concurrency cap. Failed calls are retried with
+    exponential backoff and full jitter; a Retry-After header pauses the whole provider for at
+    least that long, so concurrent callers do not keep hitting a 429. Calls made with the same
+    key while one is in flight wait for that call instead of sending a duplicate request.
+
+    Attributes:
+        max_tries (int): Attempts per call, including the first one.
+        base_delay (float): Backoff delay of the first retry in seconds.
+        max_delay (float): Upper bound of the backoff delay in seconds.
+    """
+
+    def __init__(self, max_tries: int = 3, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_tries = max(1, max_tries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._buckets = {}
+        self._semaphores = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def configure(self, provider: str, rate: float, burst: int = 1, max_concurrency: int = 4):
+
+        """
+        Set the limits of a provider.
+
+        Args:
+            provider (str): Provider name, e.g. "openai" or "gemini".
+            rate (float): Sustained requests per second.
+            burst (int): Requests allowed back to back before the rate applies.
+            max_concurrency (int): Requests allowed in flight at the same time.
+        """
+
+        with self._lock:
+            self._buckets[provider] = TokenBucket(rate, burst)
+            self._semaphores[provider] = threading.BoundedSemaphore(max_concurrency)
+
+    def call(self, provider: str, fn, *args, key=None, **kwargs):
+
+        """
+        Run fn under the provider's limits, with retries and request coalescing.
+
+        Args:
+            provider (str): Provider name passed to configure.
+            fn (callable): The request to run.
+            *args: Positional arguments for fn.
+            key (hashable): Identity of the request; concurrent calls with the same key share one result.
+            **kwargs: Keyword arguments for fn.
+
+        Returns:
+            The return value of fn.
+
+        Raises:
+            Exception: The last error of fn once every attempt failed, or the first non-retriable one.
+        """
+
+        if key is None:
+            return self._call_with_retries(provider, fn, args, kwargs)
+
+        with self._lock:
+            future = self._inflight.get((provider, key))
+            leader = future is None
+            if leader:
+                future = self._inflight[(provider, key)] = Future()
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(self._call_with_retries(provider, fn, args, kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._inflight[(provider, key)]
+        return future.result()
+
+    def _call_with_retries(self, provider: str, fn, args: tuple, kwargs: dict):
+        with self._lock:
+            if provider not in self._buckets:
+                self._buckets[provider] = TokenBucket(1.0, 1)
+                self._semaphores[provider] = threading.BoundedSemaphore(4)
+            bucket = self._buckets[provider]
+            semaphore = self._semaphores[provider]
+
+        for attempt in range(1, self.max_tries + 1):
+            bucket.acquire()
+            try:
+                with semaphore:
+                    return fn(*args, **kwargs)
+            except Exception as e:
+                status = self._status_code(e)
+                print(f"Error calling {provider} (attempt {attempt}/{self.max_tries}): {e}")
+                if attempt == self.max_tries or status in NON_RETRIABLE_STATUS:
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                retry_after = self._retry_after(e)
+                if retry_after is not None:
+                    bucket.pause(retry_after)
+                    delay = max(delay, retry_after)
+                time.sleep(delay)
+
+    @staticmethod
+    def _status_code(error: Exception):
+        candidates = (getattr(error, "status_code", None), getattr(getattr(error, "response", None), "status_code", None),
+                      getattr(error, "code", None))
+        return next((status for status in candidates if isinstance(status, int)), None)
+
+    @staticmethod
+    def _retry_after(error: Exception):
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, retry_at.timestamp() - time.time())
@@ -0,0 +1,124 @@
+import glob
+import hashlib
+import os
+import sys
+import threading
+
+import numpy as np
+from PIL import Image
+
+
+class SpriteGridDetector:
+    """
+    Detects the rows and columns of a sprite sheet locally from its pixels.
+
+    The sheet is turned into a foreground map (distance from the background colour, masked by
+    alpha) and projected onto each axis. A grid of ``n`` cells repeats with a period of
+    ``length / n``, so the autocorrelation of the projection peaks at that lag and dips at half
+    of it. Every candidate ``n`` is scored by that peak-to-half-lag contrast; the largest ``n``
+    scoring close to the best one wins, because a divisor of the true cell count (e.g. 2 for a
+    4 column sheet) also lands on a peak. The autocorrelation value at the chosen lag is the
+    confidence for that axis.
+
+    Attributes:
+        max_cells (int): Largest number of rows or columns considered.
+        score_ratio (float): Fraction of the best score a larger candidate needs to be chosen.
+    """
+
+    def __init__(self, max_cells: int = 8, score_ratio: float = 0.8):
+        self.max_cells = max_cells
+        self.score_ratio = score_ratio
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def detect(self, image_path: str) -> dict:
+
+        """
+        Detect the grid of a sprite sheet, memoized by the hash of the image file.
+
+        Args:
+            image_path (str): Path to the sprite sheet.
+
+        Returns:
+            dict: rows, cols, cell_width, cell_height and confidence (0 to 1).
+        """
+
+        with open(image_path, 'rb') as f:
+            image_hash = hashlib.sha256(f.read()).hexdigest()
+        with self._lock:
+            if image_hash in self._results:
+                return dict(self._results[image_hash])
+
+        with Image.open(image_path) as image:
+            result = self.detect_array(np.asarray(image.convert("RGBA")))
+
+        with self._lock:
+            self._results[image_hash] = result
+        return dict(result)
+
+    def detect_array(self, pixels: np.ndarray) -> dict:
+
+        """
+        Detect the grid of a sprite sheet given as an RGBA array.
+
+        Args:
+            pixels (np.ndarray): Array of shape (height, width, 4).
+
+        Returns:
+            dict: rows, cols, cell_width, cell_height and confidence (0 to 1).
+        """
+
+        foreground = self._foreground(pixels)
+        rows, row_confidence = self._detect_axis(foreground.mean(axis=1))
+        cols, col_confidence = self._detect_axis(foreground.mean(axis=0))
+        height, width = foreground.shape
+        return {
+            "rows": rows,
+            "cols": cols,
+            "cell_width": width // cols,
+            "cell_height": height // rows,
+            "confidence": round(min(row_confidence, col_confidence), 3),
+        }
+
+    @staticmethod
+    def _foreground(pixels: np.ndarray) -> np.ndarray:
+        gray = pixels[..., :3].astype(np.float32).mean(axis=-1)
+        alpha = pixels[..., 3].astype(np.float32) / 255.0
+        border = np.concatenate([gray[0], gray[-1], gray[:, 0], gray[:, -1]])
+        return np.abs(gray - np.median(border)) / 255.0 * alpha
+
+    def _detect_axis(self, profile: np.ndarray) -> tuple:
+        length = len(profile)
+        autocorrelation = self._autocorrelation(profile)
+        if autocorrelation is None:
+            return 1, 0.0
+
+        lags = np.arange(length)
+        candidates = np.arange(2, min(self.max_cells, length // 2) + 1)
+        peaks = np.interp(length / candidates, lags, autocorrelation)
+        scores = peaks - np.interp(length / candidates / 2, lags, autocorrelation)
+        best = scores.max() if len(scores) else 0.0
+        if best <= 0:
+            return 1, 0.0
+
+        chosen = np.nonzero(scores >= best * self.score_ratio)[0].max()
+        return int(candidates[chosen]), float(np.clip(peaks[chosen], 0.0, 1.0))
+
+    @staticmethod
+    def _autocorrelation(profile: np.ndarray):
+        length = len(profile)
+        centered = profile - profile.mean()
+        spectrum = np.fft.rfft(centered, 2 * length)
+        autocorrelation = np.fft.irfft(spectrum * np.conj(spectrum))[:length]
+        autocorrelation /= length - np.arange(length)
+        if autocorrelation[0] <= 0:
+            return None
+        return autocorrelation / autocorrelation[0]
+
+
+if __name__ == "__main__":
+    image_folder = sys.argv[1] if len(sys.argv) > 1 else "image_folder"
+    detector = SpriteGridDetector()
+    for path in sorted(glob.glob(os.path.join(image_folder, "*.png"))):
+        result = detector.detect(path)
+        print(f"{result['rows']}x{result['cols']} confidence={result['confidence']:.2f} {os.path.basename(path)[:60]}")
@@ -0,0 +1,352 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+
+import numpy as np
+from PIL import Image
+
+from utilities.spritegrid.spritegrid import SpriteGridDetector
+
+
+class SpriteIndex:
+    """
+    SQLite index of existing sprite sheets for reuse and duplicate pruning.
+
+    Every sheet is stored with a perceptual difference hash (dHash) of its grayscale
+    thumbnail, its grid as found by SpriteGridDetector, and the normalized tokens of the
+    prompt it was generated from. The prompt is given when a sheet is added by the pipeline,
+    or read from the file name for sheets found by scan (DALL-E download names carry the
+    revised prompt after " - ", generated sheets are named after their sanitized prompt).
+
+    nearest ranks sheets by the IDF-weighted cosine similarity of their prompt tokens, so
+    the words shared by every sprite prompt count for little and the subject (the letter, the
+    motion) decides. duplicates compares the hashes of all sheets at once and groups sheets
+    within max_distance bits of each other.
+
+    Attributes:
+        path (str): Path of the SQLite database.
+        hash_size (int): Side of the dHash grid, the hash has hash_size ** 2 bits.
+        grid_detector (SpriteGridDetector): Detector for the rows and columns of added sheets.
+        grid_confidence_threshold (float): Detector confidence below which the grid named in the
+            prompt is used instead, when there is one.
+    """
+
+    IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+    STOPWORDS = frozenset(
+        "a an and are as at be by each for from in into is it its like of on or should show showing shows so "
+        "that the their then there this to total totaling with create generate make image sprite sheet spritesheet "
+        "grid cell frame row column animation animated arranged containing featuring".split()
+    )
+
+    def __init__(self, path: str = ".sprite_index.sqlite", hash_size: int = 16,
+                 grid_detector: SpriteGridDetector = None, grid_confidence_threshold: float = 0.5):
+        self.path = path
+        self.hash_size = hash_size
+        self.grid_detector = grid_detector or SpriteGridDetector()
+        self.grid_confidence_threshold = grid_confidence_threshold
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS sheets ("
+                "path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, dhash TEXT NOT NULL, "
+                "rows INTEGER NOT NULL, cols INTEGER NOT NULL, prompt TEXT NOT NULL, tokens TEXT NOT NULL)"
+            )
+
+    @classmethod
+    def prompt_tokens(cls, prompt: str) -> list:
+
+        """
+        Normalize a prompt to its distinctive tokens.
+
+        A single upper-case character that does not start the prompt is kept as a glyph token
+        (the letter in "letter 'A'"), so it is not lost among the articles. Words are lower-cased,
+        plurals reduced to the singular, and numbers, stop words and words shared by every
+        sprite prompt dropped.
+
+        Args:
+            prompt (str): Raw or sanitized prompt.
+
+        Returns:
+            list: Sorted unique tokens.
+        """
+
+        tokens = set()
+        for index, word in enumerate(re.findall(r"[A-Za-z0-9]+", prompt.replace("_", " "))):
+            if len(word) == 1 and word.isupper() and index > 0:
+                tokens.add(f"glyph:{word.lower()}")
+                continue
+            word = word.lower()
+            if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+                word = word[:-1]
+            if word.isdigit() or re.fullmatch(r"\d+x\d+", word) or word in cls.STOPWORDS:
+                continue
+            tokens.add(word)
+        return sorted(tokens)
+
+    @staticmethod
+    def prompt_grid(prompt: str):
+
+        """
+        Read the grid a prompt asks for, e.g. "4 rows and 4 columns" or "a 4x4 grid".
+
+        Returns:
+            tuple: (rows, cols), or None when the prompt names no grid.
+        """
+
+        text = prompt.replace("_", " ").lower()
+        rows = re.search(r"(\d+)\s+rows?\b", text)
+        cols = re.search(r"(\d+)\s+col(?:umn)?s?\b", text)
+        if rows and cols:
+            return int(rows.group(1)), int(cols.group(1))
+        size = re.search(r"\b(\d+)\s*x\s*(\d+)\b", text)
+        if size:
+            return int(size.group(1)), int(size.group(2))
+        return None
+
+    @staticmethod
+    def prompt_from_path(path: str) -> str:
+        name = os.path.splitext(os.path.basename(path))[0]
+        if " - " in name:
+            name = name.split(" - ", 1)[1]
+        return name.replace("_", " ")
+
+    def dhash(self, image: Image.Image) -> str:
+
+        """
+        Perceptual difference hash: one bit per horizontally adjacent pair of thumbnail pixels.
+
+        Transparent pixels are flattened onto white first, so the hidden colors of a transparent
+        background do not change the hash.
+
+        Args:
+            image (Image.Image): The sprite sheet.
+
+        Returns:
+            str: Hex digest of hash_size ** 2 bits.
+        """
+
+        rgba = image.convert("RGBA")
+        flattened = Image.new("RGBA", rgba.size, (255, 255, 255, 255))
+        flattened.alpha_composite(rgba)
+        thumbnail = flattened.convert("L").resize((self.hash_size + 1, self.hash_size), Image.Resampling.BOX)
+        pixels = np.asarray(thumbnail, dtype=np.int16)
+        return np.packbits(pixels[:, 1:] > pixels[:, :-1]).tobytes().hex()
+
+    def add(self, path: str, prompt: str = None) -> dict:
+
+        """
+        Index a sheet, or refresh it when the file changed since it was indexed.
+
+        Args:
+            path (str): Path of the sprite sheet.
+            prompt (str): Prompt the sheet was generated from, read from the file name when None.
+
+        Returns:
+            dict: The indexed entry.
+        """
+
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT mtime_ns, size, prompt FROM sheets WHERE path = ?", (path,)).fetchone()
+        if row and row[:2] == (stat.st_mtime_ns, stat.st_size) and (prompt is None or prompt == row[2]):
+            return self.entry(path)
+
+        prompt = prompt or self.prompt_from_path(path)
+        with Image.open(path) as image:
+            digest = self.dhash(image)
+            grid = self.grid_detector.detect_array(np.asarray(image.convert("RGBA")))
+        rows, cols = grid["rows"], grid["cols"]
+        named_grid = self.prompt_grid(prompt)
+        if grid["confidence"] < self.grid_confidence_threshold and named_grid:
+            rows, cols = named_grid
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO sheets (path, mtime_ns, size, dhash, rows, cols, prompt, tokens) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, stat.st_mtime_ns, stat.st_size, digest, rows, cols, prompt,
+                 " ".join(self.prompt_tokens(prompt))),
+            )
+        return dict(path=path, dhash=digest, rows=rows, cols=cols, prompt=prompt)
+
+    def scan(self, directories) -> dict:
+
+        """
+        Index every image below the given directories and drop entries whose file is gone.
+
+        Args:
+            directories (list): Directories to walk, or a single directory.
+
+        Returns:
+            dict: Number of indexed, unchanged and removed sheets.
+        """
+
+        if isinstance(directories, str):
+            directories = [directories]
+        counts = dict(indexed=0, unchanged=0, removed=0)
+        known = {entry["path"]: entry for entry in self.entries()}
+        for directory in directories:
+            for root, _, names in os.walk(directory):
+                for name in sorted(names):
+                    if not name.lower().endswith(self.IMAGE_EXTENSIONS):
+                        continue
+                    path = os.path.abspath(os.path.join(root, name))
+                    stat = os.stat(path)
+                    entry = known.get(path)
+                    if entry and (entry["mtime_ns"], entry["size"]) == (stat.st_mtime_ns, stat.st_size):
+                        counts["unchanged"] += 1
+                        continue
+                    try:
+                        self.add(path)
+                        counts["indexed"] += 1
+                    except (IOError, ValueError) as e:
+                        print(f"Skipping {path}: {e}")
+        for path in known:
+            if not os.path.exists(path):
+                self.remove(path)
+                counts["removed"] += 1
+        return counts
+
+    def remove(self, path: str):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM sheets WHERE path = ?", (os.path.abspath(path),))
+
+    def entries(self) -> list:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT path, mtime_ns, size, dhash, rows, cols, prompt, tokens FROM sheets ORDER BY path").fetchall()
+        keys = ("path", "mtime_ns", "size", "dhash", "rows", "cols", "prompt", "tokens")
+        return [dict(zip(keys, row), tokens=row[7].split()) for row in rows]
+
+    def entry(self, path: str) -> dict:
+        path = os.path.abspath(path)
+        return next((entry for entry in self.entries() if entry["path"] == path), None)
+
+    def nearest(self, prompt: str, rows: int = None, cols: int = None, threshold: float = 0.5,
+                limit: int = 1) -> list:
+
+        """
+        Find the existing sheets closest to a prompt and grid.
+
+        Args:
+            prompt (str): Prompt of the sheet that would be generated.
+            rows (int): Rows the sheet must have, read from the prompt when None.
+            cols (int): Columns the sheet must have, read from the prompt when None.
+            threshold (float): Smallest prompt similarity (0 to 1) of a match.
+            limit (int): Largest number of matches returned.
+
+        Returns:
+            list: Matching entries with their "similarity", best first; empty when none is close enough.
+        """
+
+        if rows is None or cols is None:
+            rows, cols = self.prompt_grid(prompt) or (None, None)
+        indexed = self.entries()
+        entries = [entry for entry in indexed if rows is None or (entry["rows"], entry["cols"]) == (rows, cols)]
+        query = self.prompt_tokens(prompt)
+        if not entries or not query:
+            return []
+
+        # rare tokens identify the subject, tokens in every prompt carry almost no weight
+        document_frequency = {}
+        for entry in indexed:
+            for token in entry["tokens"]:
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+
+        def weight(token):
+            return math.log((len(indexed) + 1) / (document_frequency.get(token, 0) + 1)) + 1
+
+        query_norm = math.sqrt(sum(weight(token) ** 2 for token in query))
+        matches = []
+        for entry in entries:
+            tokens = set(entry["tokens"])
+            if not tokens:
+                continue
+            shared = sum(weight(token) ** 2 for token in query if token in tokens)
+            similarity = shared / (query_norm * math.sqrt(sum(weight(token) ** 2 for token in tokens)))
+            if similarity >= threshold:
+                matches.append(dict(entry, similarity=similarity))
+        matches.sort(key=lambda match: match["similarity"], reverse=True)
+        return matches[:limit]
+
+    def hash_distances(self, digests: list) -> np.ndarray:
+
+        """
+        Hamming distances between every pair of hashes.
+
+        Args:
+            digests (list): Hex digests from dhash.
+
+        Returns:
+            np.ndarray: Symmetric (n, n) array of differing bits.
+        """
+
+        bits = np.unpackbits(np.frombuffer(bytes.fromhex("".join(digests)), dtype=np.uint8))
+        bits = bits.reshape(len(digests), -1).astype(np.float32)
+        # |a xor b| = |a| + |b| - 2 a.b, so one matrix product compares all pairs
+        counts = bits.sum(axis=1)
+        distances = counts[:, None] + counts[None, :] - 2 * (bits @ bits.T)
+        return np.rint(distances).astype(np.uint16)
+
+    def duplicates(self, max_distance: int = None) -> list:
+
+        """
+        Group sheets that look the same, e.g. resized or re-encoded copies.
+
+        Every two sheets of a group are within max_distance of each other, so a chain of
+        small differences does not pull unrelated sheets into one group. Groups are built
+        greedily, around the sheet with the most close neighbours first, and a sheet is in
+        at most one group.
+
+        Args:
+            max_distance (int): Largest number of differing hash bits between two sheets of
+                a group, 8% of the hash bits when None.
+
+        Returns:
+            list: Groups (lists of entries) of two or more sheets, each sorted by path.
+        """
+
+        entries = self.entries()
+        if len(entries) < 2:
+            return []
+        if max_distance is None:
+            max_distance = self.hash_size ** 2 * 8 // 100
+        distances = self.hash_distances([entry["dhash"] for entry in entries])
+        close = distances <= max_distance
+        np.fill_diagonal(close, False)
+        grouped = np.zeros(len(entries), dtype=bool)
+        groups = []
+        for first in np.argsort(-close.sum(axis=1), kind="stable"):
+            if grouped[first]:
+                continue
+            members = [first]
+            candidates = np.flatnonzero(close[first] & ~grouped)
+            for candidate in candidates[np.argsort(distances[first, candidates], kind="stable")]:
+                if close[candidate, members].all():
+                    members.append(candidate)
+            if len(members) > 1:
+                grouped[members] = True
+                groups.append(sorted(members))
+        return [[entries[index] for index in group] for group in sorted(groups)]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    index = SpriteIndex()
+    print(index.scan(sys.argv[2:] or ["image_folder", "generated_sprites"]))
+    for match in index.nearest(sys.argv[1], threshold=0.0, limit=5):
+        print(f"{match['similarity']:.2f} {match['rows']}x{match['cols']} {match['path']}")
+    for group in index.duplicates():
+        print("duplicates:", ", ".join(entry["path"] for entry in group))
@@ -0,0 +1,236 @@
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from utilities.ffmpegtools.ffmpegtools import FFmpegTools
+
+
+class VideoMerger:
+    """
+    Merges videos into one file, re-encoding only what has to be re-encoded.
+
+    Every input is probed first. When all inputs already share codec, resolution, frame rate,
+    pixel format and audio layout (and match the target size), they are joined with a stream
+    copy. Otherwise each input is normalized to the target parameters by its own ffmpeg
+    process, in parallel, and the normalized files are joined with a stream copy. Frames are
+    never held in Python memory and every file handle belongs to an ffmpeg process that exits
+    before merge returns.
+
+    Attributes:
+        ffmpeg (FFmpegTools): ffmpeg wrapper used for probing and encoding.
+        workers (int): Number of inputs normalized at the same time.
+        codec_args (list): Encoder arguments for normalized clips.
+        variable_frame_rate (bool): Keep the frame timing of every input instead of resampling all inputs to
+            the highest frame rate, which would insert duplicate frames into slower clips.
+    """
+
+    LADDER_HEIGHTS = (480, 720, 1080)
+    COPY_KEYS = ("video_codec", "width", "height", "fps", "pix_fmt", "audio_codec", "sample_rate", "channels")
+
+    def __init__(self, ffmpeg: FFmpegTools = None, workers: int = None, codec_args: list = None,
+                 variable_frame_rate: bool = False):
+        self.ffmpeg = ffmpeg or FFmpegTools()
+        self.workers = workers or os.cpu_count() or 1
+        self.codec_args = codec_args or ["-c:v", "libx264", "-pix_fmt", "yuv420p"]
+        self.variable_frame_rate = variable_frame_rate
+
+    def can_stream_copy(self, probes: list, target_width: int, target_height: int) -> bool:
+
+        """
+        Check whether probed inputs can be concatenated without re-encoding.
+
+        Args:
+            probes (list): Results of FFmpegTools.probe for every input.
+            target_width (int): Width of the merged video.
+            target_height (int): Height of the merged video.
+
+        Returns:
+            bool: True when every input has the same stream parameters and the target size.
+        """
+
+        first = probes[0]
+        if first["video_codec"] is None or (first["width"], first["height"]) != (target_width, target_height):
+            return False
+        return all(probe[key] == first[key] for probe in probes[1:] for key in self.COPY_KEYS)
+
+    def normalize(self, input_path: str, output_path: str, target_width: int, target_height: int,
+                  frame_rate: float, with_audio: bool, has_audio: bool):
+
+        """
+        Re-encode one input to the common merge parameters.
+
+        Args:
+            input_path (str): Path of the input video.
+            output_path (str): Path of the normalized video.
+            target_width (int): Output width.
+            target_height (int): Output height.
+            frame_rate (float): Output frame rate.
+            with_audio (bool): Whether the merged video carries an audio track.
+            has_audio (bool): Whether this input has an audio track; silence is added when it does not.
+        """
+
+        args = ["-i", input_path]
+        if with_audio and not has_audio:
+            args += ["-f", "lavfi", "-i", "anullsrc=r=44100:cl=stereo", "-map", "0:v:0", "-map", "1:a:0", "-shortest"]
+        elif with_audio:
+            args += ["-map", "0:v:0", "-map", "0:a:0"]
+        video_filter = f"scale={target_width}:{target_height},setsar=1"
+        if self.variable_frame_rate:
+            # a common time scale lets the clips be joined with a stream copy
+            args += ["-fps_mode", "vfr", "-video_track_timescale", "90000"]
+        else:
+            video_filter += f",fps={frame_rate:g}"
+        args += ["-vf", video_filter, *self.codec_args]
+        args += ["-c:a", "aac", "-ar", "44100", "-ac", "2"] if with_audio else ["-an"]
+        self.ffmpeg.run([*args, output_path])
+
+    def merge(self, video_paths: list, output_path: str, target_width: int, target_height: int) -> str:
+
+        """
+        Merge videos into one file of the target size.
+
+        Args:
+            video_paths (list): Paths of the input videos, in playback order.
+            output_path (str): Path of the merged video.
+            target_width (int): Width of the merged video.
+            target_height (int): Height of the merged video.
+
+        Returns:
+            str: Path of the merged video.
+
+        Raises:
+            ValueError: If no input videos are given.
+        """
+
+        if not video_paths:
+            raise ValueError("No videos to merge.")
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            probes = list(pool.map(self.ffmpeg.probe, video_paths))
+
+        if self.can_stream_copy(probes, target_width, target_height):
+            self.ffmpeg.concat_copy(video_paths, output_path)
+            return output_path
+
+        frame_rate = max(probe["fps"] or 0 for probe in probes) or 25
+        with_audio = any(probe["audio_codec"] for probe in probes)
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_path))) as temp_dir:
+            normalized_paths = [os.path.join(temp_dir, f"{index}.mp4") for index in range(len(video_paths))]
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                jobs = [
+                    pool.submit(self.normalize, path, normalized_path, target_width, target_height, frame_rate,
+                                with_audio, bool(probe["audio_codec"]))
+                    for path, normalized_path, probe in zip(video_paths, normalized_paths, probes)
+                ]
+                for job in jobs:
+                    job.result()
+            # the last frame of a variable frame rate clip has no fixed length, so every clip keeps its probed one
+            input_durations = [probe["duration"] for probe in probes] if self.variable_frame_rate else None
+            if input_durations and not all(input_durations):
+                input_durations = None
+            self.ffmpeg.concat_copy(normalized_paths, output_path, input_durations=input_durations)
+        return output_path
+
+    @staticmethod
+    def rendition_size(height: int, aspect: float) -> tuple:
+        # yuv420p needs even dimensions
+        return max(2, round(height * aspect / 2) * 2), max(2, height - height % 2)
+
+    def merge_ladder(self, video_paths: list, output_directory: str, heights: tuple = LADDER_HEIGHTS,
+                     aspect: float = None, poster: bool = True, name: str = "video") -> dict:
+
+        """
+        Merge videos into a ladder of renditions of different heights, decoding every input once.
+
+        A single ffmpeg process decodes and concatenates the inputs at the largest rendition size,
+        then splits the frames to one scaler and encoder per rendition (and a poster frame); ffmpeg
+        runs the encoders in parallel. A manifest of the produced files is written next to them
+        as {name}.json.
+
+        Args:
+            video_paths (list): Paths of the input videos, in playback order.
+            output_directory (str): Directory of the renditions, the poster and the manifest.
+            heights (tuple): Rendition heights, e.g. (480, 720, 1080).
+            aspect (float): Width to height ratio of the renditions, the one of the first input when None.
+            poster (bool): Also write {name}_poster.jpg at the largest size.
+            name (str): Base name of the output files.
+
+        Returns:
+            dict: The manifest, with the duration and the path, size and bytes of every file.
+
+        Raises:
+            ValueError: If no input videos or no heights are given.
+        """
+
+        if not video_paths:
+            raise ValueError("No videos to merge.")
+        if not heights:
+            raise ValueError("No rendition heights given.")
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            probes = list(pool.map(self.ffmpeg.probe, video_paths))
+        if aspect is None:
+            aspect = probes[0]["width"] / probes[0]["height"] if probes[0]["height"] else 1.0
+        heights = sorted(set(heights))
+        sizes = [self.rendition_size(height, aspect) for height in heights]
+        top_width, top_height = sizes[-1]
+        frame_rate = max(probe["fps"] or 0 for probe in probes) or 25
+        with_audio = any(probe["audio_codec"] for probe in probes)
+
+        # every input is brought to the largest size once, then the timeline is split per rendition
+        inputs, graph, segments = [], [], []
+        for index, (path, probe) in enumerate(zip(video_paths, probes)):
+            inputs += ["-i", path]
+            video_filter = f"scale={top_width}:{top_height},setsar=1"
+            if not self.variable_frame_rate:
+                video_filter += f",fps={frame_rate:g}"
+            graph.append(f"[{index}:v:0]{video_filter}[v{index}]")
+            segments.append(f"[v{index}]")
+            if with_audio:
+                if probe["audio_codec"]:
+                    graph.append(f"[{index}:a:0]aresample=44100,aformat=channel_layouts=stereo[a{index}]")
+                else:
+                    graph.append(f"anullsrc=r=44100:cl=stereo,atrim=duration={probe['duration'] or 0}[a{index}]")
+                segments.append(f"[a{index}]")
+        graph.append(f"{''.join(segments)}concat=n={len(video_paths)}:v=1:a={int(with_audio)}"
+                     f"[timeline]{'[audio]' if with_audio else ''}")
+        branches = len(sizes) + int(poster)
+        graph.append(f"[timeline]split={branches}{''.join(f'[s{index}]' for index in range(branches))}")
+        if with_audio:
+            graph.append(f"[audio]asplit={len(sizes)}{''.join(f'[as{index}]' for index in range(len(sizes)))}")
+
+        os.makedirs(output_directory, exist_ok=True)
+        outputs, renditions = [], []
+        for index, (height, (width, out_height)) in enumerate(zip(heights, sizes)):
+            if (width, out_height) == (top_width, top_height):
+                graph.append(f"[s{index}]null[r{index}]")
+            else:
+                graph.append(f"[s{index}]scale={width}:{out_height}[r{index}]")
+            path = os.path.join(output_directory, f"{name}_{height}p.mp4")
+            outputs += ["-map", f"[r{index}]"]
+            if self.variable_frame_rate:
+                outputs += ["-fps_mode", "vfr"]
+            outputs += [*self.codec_args]
+            outputs += ["-map", f"[as{index}]", "-c:a", "aac"] if with_audio else ["-an"]
+            outputs += ["-movflags", "+faststart", path]
+            renditions.append(dict(name=f"{height}p", path=path, width=width, height=out_height))
+        poster_path = None
+        if poster:
+            poster_path = os.path.join(output_directory, f"{name}_poster.jpg")
+            graph.append(f"[s{len(sizes)}]thumbnail=25[poster]")
+            outputs += ["-map", "[poster]", "-frames:v", "1", "-q:v", "3", poster_path]
+
+        self.ffmpeg.run([*inputs, "-filter_complex", ";".join(graph), *outputs])
+
+        for rendition in renditions:
+            rendition["bytes"] = os.path.getsize(rendition["path"])
+        duration = self.ffmpeg.probe(renditions[-1]["path"])["duration"]
+        manifest = dict(name=name, inputs=list(video_paths), duration=duration, frame_rate=frame_rate,
+                        renditions=renditions)
+        if poster_path:
+            manifest["poster"] = dict(path=poster_path, width=top_width, height=top_height,
+                                      bytes=os.path.getsize(poster_path))
+        manifest_path = os.path.join(output_directory, f"{name}.json")
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        manifest["manifest"] = manifest_path
+        return manifest